@@ -0,0 +1,106 @@
+import os
+import sys
+import glob
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lxml.html
+import html2text
+from bs4 import BeautifulSoup
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import StaleElementReferenceException
+from create_site_map import EXTRACT_PAGE_SCRIPT, convert_html_to_markdown, find_main_content, get_driver, tidy_markdown
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+def legacy_extract(html_content):
+    """The original BeautifulSoup html.parser path, kept as a reference."""
+    soup = BeautifulSoup(html_content, 'html.parser')
+    content = soup.find('main') or soup.find('body')
+    if content is None:
+        return None
+    for tag in content.find_all(['header', 'footer']):
+        tag.decompose()
+    return str(content)
+
+def legacy_convert(html_content):
+    """The original conversion: html2text tokenizing an HTML string with html.parser."""
+    h = html2text.HTML2Text()
+    h.body_width = 0
+    return tidy_markdown(h.handle(html_content))
+
+def lxml_extract(html_content):
+    return find_main_content(lxml.html.fromstring(html_content))
+
+def legacy_in_page(driver):
+    """The original Chrome path: transfer page_source, parse it, then one round trip per <a>."""
+    html = legacy_extract(driver.page_source)
+    hrefs = set()
+    for link in driver.find_elements(By.TAG_NAME, 'a'):
+        try:
+            href = link.get_attribute('href')
+            if href is not None and href.startswith('http'):
+                hrefs.add(href)
+        except StaleElementReferenceException:
+            continue
+    return html, hrefs
+
+def script_in_page(driver):
+    """What get_page_details does now: one EXTRACT_PAGE_SCRIPT call."""
+    extracted = driver.execute_script(EXTRACT_PAGE_SCRIPT)
+    return extracted['html'], set(extracted['hrefs'])
+
+def bench_chrome(paths, repeat, screen_width='1366'):
+    driver = get_driver(screen_width)
+    try:
+        for path in paths:
+            driver.get(f"file://{os.path.abspath(path)}")
+            (legacy_html, legacy_hrefs), legacy_time = time_call(legacy_in_page, driver, repeat)
+            (script_html, script_hrefs), script_time = time_call(script_in_page, driver, repeat)
+            legacy_markdown, legacy_convert_time = time_call(legacy_convert, legacy_html, repeat)
+            markdown, convert_time = time_call(convert_html_to_markdown, script_html, repeat)
+            legacy_total, total = legacy_time + legacy_convert_time, script_time + convert_time
+            print(f"{os.path.basename(path)} ({len(script_hrefs)} links): page_source + get_attribute {legacy_time * 1000:.1f}ms, "
+                  f"in-page script {script_time * 1000:.1f}ms ({legacy_time / script_time:.1f}x); "
+                  f"html2text {legacy_convert_time * 1000:.1f}ms, lxml tree {convert_time * 1000:.1f}ms ({legacy_convert_time / convert_time:.1f}x); "
+                  f"total {legacy_total * 1000:.1f}ms -> {total * 1000:.1f}ms ({legacy_total / total:.1f}x), "
+                  f"same markdown: {legacy_markdown == markdown}, same links: {legacy_hrefs == script_hrefs}")
+    finally:
+        driver.quit()
+
+def time_call(func, arg, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        result = func(arg)
+    return result, (time.perf_counter() - start) / repeat
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark main-content extraction and markdown conversion on saved HTML pages: the HTTP engine's lxml path by default, the Chrome path with --chrome.")
+    parser.add_argument('fixtures', nargs='*', help="HTML files to extract from (default: benchmarks/fixtures/*.html).")
+    parser.add_argument('--repeat', type=int, default=20, help="Runs per file, averaged (default: 20).")
+    parser.add_argument('--chrome', action='store_true', help="Load each file in headless Chrome and time the in-page extraction script against page_source plus one get_attribute per link; needs Chrome.")
+    args = parser.parse_args()
+
+    paths = args.fixtures or sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html')))
+    if args.chrome:
+        bench_chrome(paths, args.repeat)
+        return
+    for path in paths:
+        with open(path, encoding='utf-8') as f:
+            html_content = f.read()
+        legacy_html, legacy_time = time_call(legacy_extract, html_content, args.repeat)
+        legacy_markdown, legacy_convert_time = time_call(legacy_convert, legacy_html, args.repeat)
+        # find_main_content edits the tree, so each run gets a fresh parse
+        _, extract_time = time_call(lxml_extract, html_content, args.repeat)
+        markdown, convert_time = time_call(convert_html_to_markdown, lxml_extract(html_content), args.repeat)
+        legacy_total, total = legacy_time + legacy_convert_time, extract_time + convert_time
+        print(f"{os.path.basename(path)} ({len(html_content) // 1024} KB): extract BeautifulSoup {legacy_time * 1000:.1f}ms, "
+              f"lxml {extract_time * 1000:.1f}ms ({legacy_time / extract_time:.1f}x); "
+              f"convert html2text {legacy_convert_time * 1000:.1f}ms, lxml tree {convert_time * 1000:.1f}ms ({legacy_convert_time / convert_time:.1f}x); "
+              f"total {legacy_total * 1000:.1f}ms -> {total * 1000:.1f}ms ({legacy_total / total:.1f}x), "
+              f"same markdown: {legacy_markdown == markdown}")
+
+if __name__ == "__main__":
+    main()
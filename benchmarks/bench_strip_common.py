@@ -0,0 +1,147 @@
+import io
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import contextlib
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strip_common import find_common_blocks, process_markdown_directory_streaming, read_markdown_files, remove_common_blocks
+
+def legacy_find_common_blocks(markdown_files, min_block_size=2):
+    """The original quadratic implementation, kept as a reference."""
+    line_blocks = defaultdict(int)
+
+    for lines in markdown_files.values():
+        seen_blocks = set()
+        for i in range(len(lines)):
+            for j in range(i + min_block_size, len(lines) + 1):
+                block = tuple(lines[i:j])
+                if block not in seen_blocks:
+                    line_blocks[block] += 1
+                    seen_blocks.add(block)
+
+    threshold = len(markdown_files) * 0.8
+    return {block for block, count in line_blocks.items() if count >= threshold}
+
+def legacy_remove_common_blocks(markdown_files, common_blocks):
+    """The original removal loop, unchanged."""
+    cleaned_files = {}
+
+    for filename, lines in markdown_files.items():
+        cleaned_lines = []
+        i = 0
+        length = len(lines)
+
+        while i < length:
+            block_found = False
+            for block in common_blocks:
+                block_size = len(block)
+                if tuple(lines[i:i + block_size]) == block:
+                    # Skip over the common block
+                    i += block_size
+                    block_found = True
+                    break
+            if not block_found:
+                # If no block is found, just append the line
+                cleaned_lines.append(lines[i])
+                i += 1
+
+        cleaned_files[filename] = cleaned_lines
+
+    return cleaned_files
+
+def legacy_strip(markdown_files, min_block_size):
+    """
+    The original pipeline. Its removal loop takes the first block in set
+    order that matches, so the blocks are handed to it longest first to make
+    its choice deterministic and the same as the new code's.
+    """
+    blocks = legacy_find_common_blocks(markdown_files, min_block_size)
+    return legacy_remove_common_blocks(markdown_files, sorted(blocks, key=len, reverse=True))
+
+def streaming_strip(markdown_files, min_block_size):
+    """Run process_markdown_directory_streaming over the files in a scratch directory."""
+    with tempfile.TemporaryDirectory() as directory:
+        for filename, lines in markdown_files.items():
+            with open(os.path.join(directory, filename), 'w', encoding='utf-8') as file:
+                file.writelines(lines)
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_markdown_directory_streaming(directory, min_block_size=min_block_size, chunk_size=2)
+        return read_markdown_files(directory)
+
+def small_corpora(count, seed=0):
+    """
+    Tiny corpora over a few distinct lines, where common windows often
+    overlap without the span they cover being common. The first one is a
+    known case: ("a", "b") and ("b", "c") are common but ("a", "b", "c") is not.
+    """
+    yield {"f0.md": ["a\n", "b\n", "c\n", "u0\n"], **{f"f{n}.md": ["a\n", "b\n", "z\n", "b\n", "c\n"] for n in range(1, 5)}}
+    rng = random.Random(seed)
+    for _ in range(count - 1):
+        vocabulary = [f"{chr(97 + i)}\n" for i in range(rng.randint(2, 5))]
+        yield {f"f{n}.md": [rng.choice(vocabulary) for _ in range(rng.randint(2, 9))] for n in range(rng.randint(1, 7))}
+
+def check_small_corpora(count, min_block_size):
+    """Number of small corpora where the new in-memory or streaming output differs from the original."""
+    mismatches = 0
+    for corpus in small_corpora(count):
+        expected = legacy_strip(corpus, min_block_size)
+        cleaned = remove_common_blocks(corpus, find_common_blocks(corpus, min_block_size))
+        if cleaned != expected or streaming_strip(corpus, min_block_size) != expected:
+            mismatches += 1
+    return mismatches
+
+def make_corpus(file_count, body_lines, seed=0):
+    """Synthetic pages: a shared header and footer around a mostly unique body."""
+    rng = random.Random(seed)
+    header = ["# Site\n", "\n", "[Home](/) [Docs](/docs) [Blog](/blog)\n", "\n"]
+    footer = ["\n", "---\n", "Copyright Example Inc.\n", "[Privacy](/privacy)\n"]
+    shared = [f"Shared paragraph {i}\n" for i in range(20)]
+    corpus = {}
+    for n in range(file_count):
+        body = []
+        for _ in range(body_lines):
+            if rng.random() < 0.1:
+                body.append(rng.choice(shared))
+            else:
+                body.append(f"Line {rng.randrange(10 ** 9)} of page {n}\n")
+        corpus[f"page_{n}.md"] = header + body + footer
+    return corpus
+
+def time_call(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark strip_common against the original quadratic implementation.")
+    parser.add_argument('--files', type=int, default=10000, help="Files in the synthetic corpus (default: 10000).")
+    parser.add_argument('--lines', type=int, default=60, help="Body lines per file (default: 60).")
+    parser.add_argument('--legacy-files', type=int, default=200, help="Files given to the legacy implementation, which is quadratic (default: 200).")
+    parser.add_argument('--min-block-size', type=int, default=2)
+    parser.add_argument('--checks', type=int, default=300, help="Tiny random corpora whose output is compared with the original code (default: 300).")
+    args = parser.parse_args()
+
+    mismatches = check_small_corpora(args.checks, args.min_block_size)
+    print(f"{args.checks} small corpora: {mismatches} differ from the original output")
+
+    small = make_corpus(args.legacy_files, args.lines)
+    legacy_blocks, legacy_find = time_call(legacy_find_common_blocks, small, args.min_block_size)
+    legacy_cleaned, legacy_remove = time_call(legacy_remove_common_blocks, small, sorted(legacy_blocks, key=len, reverse=True))
+    blocks, find_time = time_call(find_common_blocks, small, args.min_block_size)
+    cleaned, remove_time = time_call(remove_common_blocks, small, blocks)
+    print(f"{args.legacy_files} files: legacy find {legacy_find:.2f}s remove {legacy_remove:.2f}s, "
+          f"new find {find_time:.2f}s remove {remove_time:.2f}s, output matches: {cleaned == legacy_cleaned}")
+
+    corpus = make_corpus(args.files, args.lines)
+    blocks, find_time = time_call(find_common_blocks, corpus, args.min_block_size)
+    cleaned, remove_time = time_call(remove_common_blocks, corpus, blocks)
+    print(f"{args.files} files: new find {find_time:.2f}s remove {remove_time:.2f}s, {len(blocks)} common blocks")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,206 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from urllib.parse import urlparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import lxml.html
+from fixture_site import add_site_arguments, serve, site_from_args
+from crawl_timing import PERCENTILES, StageTimer, percentile, summarize_timings
+
+TOOLS = ('crawl', 'convert', 'strip_common', 'check_links')
+
+SCREEN_WIDTH = '1366'
+
+def parse_tools(value):
+    tools = [tool.strip() for tool in value.split(',') if tool.strip()]
+    unknown = [tool for tool in tools if tool not in TOOLS]
+    if unknown or not tools:
+        raise argparse.ArgumentTypeError(f"expected a comma-separated subset of {', '.join(TOOLS)}, got {value!r}")
+    return tools
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+def rate(count, seconds):
+    return round(count / seconds, 2) if seconds else None
+
+def fixture_markdown(site):
+    """Markdown for every page of the site, converted the way the crawler does it."""
+    from create_site_map import convert_html_to_markdown, extract_main_html
+
+    for n in range(site.page_count()):
+        yield n, convert_html_to_markdown(extract_main_html(lxml.html.fromstring(site.render(n))))
+
+def bench_crawl(site, args):
+    from create_site_map import CrawlFrontier, create_artifact_writer, create_page_loaders, crawl_site
+    from host_scheduler import HostScheduler
+
+    base_domain = urlparse(site.base_url).netloc
+    loaders = create_page_loaders(args.engine, args.workers, SCREEN_WIDTH, base_domain=base_domain)
+    artifacts = create_artifact_writer(args.work_dir, [SCREEN_WIDTH])
+    frontier = CrawlFrontier(base_domain, max_depth=args.depth)
+    frontier.admit(f"{site.base_url}/page/0.html", 0)
+    start = time.perf_counter()
+    try:
+        site_map = crawl_site(loaders, frontier, artifacts, scheduler=HostScheduler(max_per_host=args.workers))
+    finally:
+        artifacts.close()
+        for loader in loaders:
+            loader.quit()
+    seconds = time.perf_counter() - start
+
+    # Input for the strip_common and check_links runs
+    with open(os.path.join(args.work_dir, 'sitemap.json'), 'w') as f:
+        json.dump(site_map, f)
+    errors = sum(1 for page in site_map.values() if (page.get("http_status_code") or 200) >= 400)
+    return {"pages": len(site_map), "errors": errors, "seconds": round(seconds, 3),
+            "pages_per_sec": rate(len(site_map), seconds), "stages": summarize_timings(site_map.values())}
+
+def bench_convert(site, args):
+    from create_site_map import convert_html_to_markdown, extract_main_html
+    from near_duplicates import simhash
+
+    # Pages are rendered up front so only extraction and conversion are timed
+    site.base_url = site.base_url or 'http://fixture.invalid'
+    documents = [site.render(n) for n in range(site.page_count())]
+    pages = []
+    start = time.perf_counter()
+    for html_content in documents:
+        timer = StageTimer()
+        with timer.stage('extract'):
+            main_html = extract_main_html(lxml.html.fromstring(html_content))
+        with timer.stage('convert'):
+            markdown_content = convert_html_to_markdown(main_html)
+        with timer.stage('simhash'):
+            simhash(markdown_content)
+        pages.append({"timings_ms": timer.timings})
+    seconds = time.perf_counter() - start
+    return {"pages": len(pages), "seconds": round(seconds, 3), "pages_per_sec": rate(len(pages), seconds),
+            "stages": summarize_timings(pages)}
+
+def bench_strip_common(site, args):
+    from strip_common import find_common_blocks, read_markdown_files, remove_common_blocks
+
+    texts_dir = os.path.join(args.work_dir, f"texts_{SCREEN_WIDTH}")
+    if not os.path.isdir(texts_dir):
+        # strip_common on its own: write what a crawl would have
+        os.makedirs(texts_dir)
+        for n, markdown_content in fixture_markdown(site):
+            with open(os.path.join(texts_dir, f"{n}.md"), 'w', encoding='utf-8') as f:
+                f.write(markdown_content)
+
+    markdown_files = read_markdown_files(texts_dir)
+    timer = StageTimer()
+    start = time.perf_counter()
+    with timer.stage('find_common_blocks'):
+        common_blocks = find_common_blocks(markdown_files)
+    with timer.stage('remove_common_blocks'):
+        remove_common_blocks(markdown_files, common_blocks)
+    seconds = time.perf_counter() - start
+    # One pass over the whole corpus, so each stage has a single sample
+    return {"files": len(markdown_files), "common_blocks": len(common_blocks), "seconds": round(seconds, 3),
+            "files_per_sec": rate(len(markdown_files), seconds), "stages_ms": timer.timings}
+
+def bench_check_links(site, args):
+    from check_links import check_links_async
+
+    sitemap_path = os.path.join(args.work_dir, 'sitemap.json')
+    if not os.path.exists(sitemap_path):
+        # check_links on its own: the links every page of the site carries
+        site_map = {}
+        for n in range(site.page_count()):
+            document = lxml.html.fromstring(site.render(n))
+            site_map[f"{site.base_url}/page/{n}.html"] = {"links": document.xpath('//a/@href')}
+        with open(sitemap_path, 'w') as f:
+            json.dump(site_map, f)
+
+    report_path = os.path.join(args.work_dir, 'link_report.jsonl')
+    start = time.perf_counter()
+    # Short backoff: injected errors should cost retries, not idle seconds
+    asyncio.run(check_links_async(sitemap_path, report_path, per_host=args.workers * 2, retries=1, backoff=0.05))
+    seconds = time.perf_counter() - start
+
+    with open(report_path) as f:
+        results = [json.loads(line) for line in f]
+    elapsed = sorted(result["elapsed_ms"] for result in results)
+    latency = {f"p{pct}": percentile(elapsed, pct) for pct in PERCENTILES} if elapsed else {}
+    return {"links": len(results), "broken": sum(1 for result in results if result["ok"] is False),
+            "seconds": round(seconds, 3), "links_per_sec": rate(len(results), seconds), "latency_ms": latency}
+
+BENCHMARKS = {
+    'crawl': bench_crawl,
+    'convert': bench_convert,
+    'strip_common': bench_strip_common,
+    'check_links': bench_check_links,
+}
+
+def run_tool(args):
+    # Runs in a child process of its own, so peak RSS belongs to this tool alone
+    site = site_from_args(args)
+    site.base_url = args.site_url
+    result = BENCHMARKS[args.tool](site, args)
+    result["peak_rss_mb"] = peak_rss_mb()
+    with open(args.result, 'w') as f:
+        json.dump(result, f)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the crawler and its post-processing tools against a local synthetic site; prints a JSON report.")
+    add_site_arguments(parser)
+    parser.add_argument('--tools', type=parse_tools, default=list(TOOLS), help=f"Comma-separated tools to run, in order (default: {','.join(TOOLS)}).")
+    parser.add_argument('--engine', choices=['http', 'chrome'], default='http', help="Page loader for the crawl; chrome needs a local Chrome (default: http).")
+    parser.add_argument('--workers', type=int, default=4, help="Crawl workers; check_links gets twice as many requests per host (default: 4).")
+    parser.add_argument('-o', '--output', type=str, help="Also write the report to this file.")
+    parser.add_argument('--verbose', action='store_true', help="Show the tools' own output.")
+    # Set by the parent when it starts a child for one tool
+    parser.add_argument('--tool', choices=TOOLS, help=argparse.SUPPRESS)
+    parser.add_argument('--site-url', help=argparse.SUPPRESS)
+    parser.add_argument('--work-dir', help=argparse.SUPPRESS)
+    parser.add_argument('--result', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.tool:
+        run_tool(args)
+        return
+
+    site = site_from_args(args)
+    server = serve(site)
+    report = {
+        "site": {"pages": site.page_count(), "depth": args.depth, "fanout": args.fanout, "page_kb": args.page_kb,
+                 "latency_ms": args.latency_ms, "error_rate": args.error_rate, "dead_link_rate": args.dead_link_rate, "seed": args.seed},
+        "engine": args.engine,
+        "workers": args.workers,
+        "python": platform.python_version(),
+        "tools": {}
+    }
+    output = None if args.verbose else subprocess.DEVNULL
+    try:
+        with tempfile.TemporaryDirectory() as work_dir:
+            for tool in args.tools:
+                result_path = os.path.join(work_dir, f"{tool}.json")
+                command = [sys.executable, os.path.abspath(__file__), *sys.argv[1:],
+                           '--tool', tool, '--site-url', site.base_url, '--work-dir', work_dir, '--result', result_path]
+                subprocess.run(command, check=True, stdout=output)
+                with open(result_path) as f:
+                    report["tools"][tool] = json.load(f)
+    finally:
+        server.shutdown()
+
+    text = json.dumps(report, indent=4)
+    print(text)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + "\n")
+
+if __name__ == "__main__":
+    main()
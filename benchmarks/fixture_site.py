@@ -0,0 +1,165 @@
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+WORDS = ("crawl page site link text screen width depth index search content "
+         "market product service customer report data cloud network design "
+         "build release update guide support account price order team").split()
+
+class FixtureSite:
+    """
+    A synthetic site generated from its settings alone, so runs are repeatable.
+
+    Pages form a tree: /page/0.html links to `fanout` children, and so on
+    down to `depth` levels or until there are `pages` pages. Every page also
+    links to two random pages and, with `dead_link_rate`, to a page that does
+    not exist. Pages carry about `page_kb` KB of text inside a shared header,
+    navigation and footer. Responses are delayed by about `latency_ms`, and
+    `error_rate` of the pages always answer 500.
+    """
+
+    def __init__(self, pages=200, depth=3, fanout=6, page_kb=20, latency_ms=0, error_rate=0.0, dead_link_rate=0.1, seed=0):
+        self.pages = pages
+        self.depth = depth
+        self.fanout = fanout
+        self.page_kb = page_kb
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+        self.dead_link_rate = dead_link_rate
+        self.seed = seed
+        self.base_url = None
+
+    def page_depth(self, n):
+        depth = 0
+        while n > 0:
+            n = (n - 1) // self.fanout
+            depth += 1
+        return depth
+
+    def page_count(self):
+        # Pages beyond the tree's depth are never linked, so they do not exist
+        count, level, width = 0, 0, 1
+        while level <= self.depth and count < self.pages:
+            count += width
+            width *= self.fanout
+            level += 1
+        return min(count, self.pages)
+
+    def children(self, n):
+        if self.page_depth(n) >= self.depth:
+            return []
+        first = n * self.fanout + 1
+        return list(range(first, min(first + self.fanout, self.page_count())))
+
+    def fails(self, path):
+        digest = hashlib.blake2b(f"{self.seed}:{path}".encode('utf-8'), digest_size=8).digest()
+        return int.from_bytes(digest, 'big') / 2 ** 64 < self.error_rate
+
+    def render(self, n):
+        rng = random.Random(self.seed * 1_000_003 + n)
+        links = [f"/page/{child}.html" for child in self.children(n)]
+        links += [f"/page/{rng.randrange(self.page_count())}.html" for _ in range(2)]
+        if rng.random() < self.dead_link_rate:
+            links.append(f"/missing/{n}.html")
+        paragraphs = []
+        size = 0
+        while size < self.page_kb * 1024:
+            paragraph = ' '.join(rng.choice(WORDS) for _ in range(80))
+            paragraphs.append(f"<p>{paragraph}</p>")
+            size += len(paragraph) + 7
+        items = ''.join(f'<li><a href="{self.base_url}{link}">Link to {link}</a></li>' for link in links)
+        return (f"<!DOCTYPE html><html><head><title>Page {n}</title></head><body>"
+                f"<header><a href='{self.base_url}/page/0.html'>Fixture site</a></header><main>"
+                f"<nav><ul><li>Home</li><li>Products</li><li>Support</li></ul></nav>"
+                f"<h1>Page {n}</h1>{''.join(paragraphs)}<ul>{items}</ul>"
+                f"<p>Copyright Fixture Inc. All rights reserved.</p></main>"
+                f"<footer>Fixture footer</footer></body></html>")
+
+    def sitemap(self):
+        urls = ''.join(f"<url><loc>{self.base_url}/page/{n}.html</loc></url>" for n in range(self.page_count()))
+        return f'<?xml version="1.0" encoding="UTF-8"?><urlset xmlns="http://www.sitemaps.org/schemas/sitemap/0.9">{urls}</urlset>'
+
+    def respond(self, path):
+        """(status, content type, body) for a request path."""
+        if path == '/robots.txt':
+            return 200, 'text/plain', "User-agent: *\nAllow: /\n"
+        if path == '/sitemap.xml':
+            return 200, 'application/xml', self.sitemap()
+        if path in ('/', '/index.html'):
+            path = '/page/0.html'
+        if path.startswith('/page/') and path.endswith('.html'):
+            number = path[len('/page/'):-len('.html')]
+            if number.isdigit() and int(number) < self.page_count():
+                if self.fails(path):
+                    return 500, 'text/html', "<html><body><main><h1>Internal error</h1></main></body></html>"
+                return 200, 'text/html; charset=utf-8', self.render(int(number))
+        return 404, 'text/html', "<html><body><main><h1>Not found</h1></main></body></html>"
+
+    def make_handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def respond(self, send_body):
+                if site.latency_ms:
+                    # Uniform jitter of +/-50% around the configured latency
+                    time.sleep(site.latency_ms * random.uniform(0.5, 1.5) / 1000)
+                status, content_type, body = site.respond(self.path.split('?', 1)[0])
+                data = body.encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(data)
+
+            def do_GET(self):
+                self.respond(True)
+
+            def do_HEAD(self):
+                self.respond(False)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def serve(site, host='127.0.0.1', port=0):
+    """Serve the site from a background thread; returns the server, already listening."""
+    server = ThreadingHTTPServer((host, port), site.make_handler())
+    server.daemon_threads = True
+    site.base_url = f"http://{host}:{server.server_address[1]}"
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def add_site_arguments(parser):
+    parser.add_argument('--pages', type=int, default=200, help="Most pages in the site (default: 200).")
+    parser.add_argument('--depth', type=int, default=3, help="Levels below the home page (default: 3).")
+    parser.add_argument('--fanout', type=int, default=6, help="Child pages linked from every page (default: 6).")
+    parser.add_argument('--page-kb', type=int, default=20, help="Approximate text per page in KB (default: 20).")
+    parser.add_argument('--latency-ms', type=float, default=0, help="Mean delay before every response (default: 0).")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of pages that answer 500 (default: 0).")
+    parser.add_argument('--dead-link-rate', type=float, default=0.1, help="Fraction of pages with a link to a missing page (default: 0.1).")
+    parser.add_argument('--seed', type=int, default=0, help="Seed for page text and links (default: 0).")
+
+def site_from_args(args):
+    return FixtureSite(args.pages, args.depth, args.fanout, args.page_kb, args.latency_ms, args.error_rate, args.dead_link_rate, args.seed)
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a synthetic site for benchmarking the crawler locally.")
+    add_site_arguments(parser)
+    parser.add_argument('--port', type=int, default=8000, help="Port to listen on (default: 8000).")
+    args = parser.parse_args()
+
+    site = site_from_args(args)
+    server = serve(site, port=args.port)
+    print(f"Serving {site.page_count()} pages at {site.base_url}/ (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
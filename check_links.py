@@ -1,32 +1,144 @@
 import json
-import requests
-import logging
+import time
+import asyncio
+import argparse
+import itertools
+from collections import defaultdict
+from urllib.parse import urlsplit
+import aiohttp
+from host_scheduler import HostScheduler, RobotsCache
+from crawl_utils import RETRY_STATUSES, backoff_delay, get_retry_after
 
-# Configure logging
-logging.basicConfig(filename='link_checker.log', level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+# HEAD answers that are final; anything else >= 400 is double-checked with a GET,
+# since many servers reject or mishandle HEAD
+FINAL_HEAD_STATUSES = {404, 410} | RETRY_STATUSES
 
-def check_links(file_path):
+def load_links(file_path):
+    """Map every outbound link in a sitemap.json to the pages that link to it."""
     with open(file_path, 'r') as file:
         data = json.load(file)
-    
-    visited_links = set()
-    total_links = sum(len(details.get('links', [])) for details in data.values())
-    checked_links = 0
-    
+
+    link_sources = defaultdict(list)
     for site, details in data.items():
-        links = details.get('links', [])
-        for link in links:
-            if link in visited_links:
-                continue
-            visited_links.add(link)
-            checked_links += 1
-            print(f"Checking link {checked_links}/{total_links}: {link}")
+        for link in details.get('links', []):
+            link_sources[link].append(site)
+    return link_sources
+
+async def probe_link(session, link):
+    async with session.head(link, allow_redirects=True) as response:
+        if response.status < 400 or response.status in FINAL_HEAD_STATUSES:
+            return response.status, response.reason, 'HEAD', get_retry_after(response.headers)
+
+    # Ask for a single byte so the body is never downloaded
+    async with session.get(link, headers={'Range': 'bytes=0-0'}, allow_redirects=True) as response:
+        return response.status, response.reason, 'GET', get_retry_after(response.headers)
+
+def interleave_by_host(links):
+    # Neighbouring links go to different hosts, so workers waiting on one
+    # busy host's window do not hold up links to the others
+    by_host = defaultdict(list)
+    for link in links:
+        by_host[urlsplit(link).netloc].append(link)
+    for group in itertools.zip_longest(*by_host.values()):
+        yield from (link for link in group if link is not None)
+
+async def check_link(session, scheduler, link, retries, backoff):
+    start_time = time.monotonic()
+    result = {"url": link, "status": None, "reason": None, "method": None, "error": None, "attempts": 0}
+    if not await scheduler.allowed_async(link):
+        result["error"] = "Disallowed by robots.txt"
+        result["ok"] = None
+        result["elapsed_ms"] = 0
+        return result
+
+    for attempt in range(retries + 1):
+        result["attempts"] = attempt + 1
+        await scheduler.acquire_async(link)
+        request_start = time.monotonic()
+        retry_after = None
+        try:
+            result["status"], result["reason"], result["method"], retry_after = await probe_link(session, link)
+            result["error"] = None
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            result["status"] = None
+            result["error"] = f"{type(e).__name__}: {e}"
+        finally:
+            scheduler.release(link, result["status"], time.monotonic() - request_start, retry_after)
+        if result["status"] is not None and result["status"] not in RETRY_STATUSES:
+            break
+        if attempt < retries:
+            await asyncio.sleep(backoff_delay(backoff, attempt))
+
+    result["ok"] = result["status"] is not None and 200 <= result["status"] < 400
+    result["elapsed_ms"] = int((time.monotonic() - start_time) * 1000)
+    return result
+
+async def check_links_async(file_path, report_path, concurrency=100, per_host=8, timeout=15, retries=2, backoff=1.0, rate=None, respect_robots=False):
+    link_sources = load_links(file_path)
+    total_links = len(link_sources)
+    print(f"Checking {total_links} unique links from {file_path}")
+
+    # Each host starts at per_host requests in flight and backs off when it
+    # answers 429/503, fails or slows down
+    robots = RobotsCache('*') if respect_robots else None
+    scheduler = HostScheduler(rate, max_per_host=per_host, robots=robots)
+
+    # `concurrency` workers are the only limit on requests in flight, so no
+    # request waits in the connector's queue while its timeout runs
+    connector = aiohttp.TCPConnector(limit=0, limit_per_host=per_host, ttl_dns_cache=300)
+    client_timeout = aiohttp.ClientTimeout(total=timeout)
+    links = asyncio.Queue(maxsize=concurrency * 2)
+    results = asyncio.Queue()
+
+    async def feed():
+        for link in interleave_by_host(link_sources):
+            await links.put(link)
+
+    async def worker(session):
+        while True:
+            link = await links.get()
             try:
-                response = requests.get(link)
-                if response.status_code != 200:
-                    logging.info(f"URL: {link} - Status Code: {response.status_code} - Message: {response.reason}")
-            except requests.RequestException as e:
-                logging.error(f"Error occurred for URL: {link} - Error: {e}")
+                result = await check_link(session, scheduler, link, retries, backoff)
+            except Exception as e:
+                # Every link must report back, or the loop below never ends
+                result = {"url": link, "status": None, "reason": None, "method": None, "error": f"{type(e).__name__}: {e}", "attempts": 0, "ok": False, "elapsed_ms": 0}
+            await results.put(result)
+
+    broken_links = 0
+    async with aiohttp.ClientSession(connector=connector, timeout=client_timeout) as session:
+        tasks = [asyncio.create_task(feed())] + [asyncio.create_task(worker(session)) for _ in range(concurrency)]
+        try:
+            with open(report_path, 'w') as report:
+                for checked_links in range(1, total_links + 1):
+                    result = await results.get()
+                    result["sources"] = link_sources[result["url"]]
+                    report.write(json.dumps(result) + "\n")
+                    if result["ok"] is False:
+                        broken_links += 1
+                    print(f"Checked link {checked_links}/{total_links}: {result['url']} - {result['status'] or result['error']}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    print(f"{broken_links} of {total_links} links failed. Report written to {report_path}")
+
+def check_links(file_path, report_path='link_report.jsonl', **kwargs):
+    asyncio.run(check_links_async(file_path, report_path, **kwargs))
 
 if __name__ == "__main__":
-    check_links('sitemap.json')
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Check every outbound link in a sitemap.json.")
+    parser.add_argument('file_path', type=str, nargs='?', default='sitemap.json', help="Path to sitemap.json (default: sitemap.json).")
+    parser.add_argument('-o', '--output', type=str, default='link_report.jsonl', help="JSONL report with one result per link (default: link_report.jsonl).")
+    parser.add_argument('--concurrency', type=int, default=100, help="Maximum requests in flight overall (default: 100).")
+    parser.add_argument('--per-host', type=int, default=8, help="Maximum requests in flight per host (default: 8).")
+    parser.add_argument('--timeout', type=float, default=15, help="Seconds allowed for each request (default: 15).")
+    parser.add_argument('--retries', type=int, default=2, help="Retries after a timeout, connection error, 429 or 5xx (default: 2).")
+    parser.add_argument('--rate', type=float, help="Most requests per second to any one host (default: no fixed rate).")
+    parser.add_argument('--respect-robots', action='store_true', help="Skip links robots.txt disallows and honour its Crawl-delay.")
+    parser.add_argument('--backoff', type=float, default=1.0, help="Base delay in seconds between retries, doubled each attempt (default: 1.0).")
+    args = parser.parse_args()
+
+    check_links(args.file_path, args.output, concurrency=args.concurrency, per_host=args.per_host,
+                timeout=args.timeout, retries=args.retries, backoff=args.backoff, rate=args.rate,
+                respect_robots=args.respect_robots)
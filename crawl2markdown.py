@@ -1,32 +1,61 @@
 import os
-import requests
+import json
+import time
+import asyncio
+import aiohttp
 from markdown_it import MarkdownIt
 from bs4 import BeautifulSoup
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 import argparse
-
-def fetch_markdown(scraper, url):
-    if scraper == 'dhr':
-        print(f"Fetching markdown with dhr...")
-        api_url = f"https://md.dhr.wtf/?url={url}"
-    elif scraper == 'jina':
-        print(f"Fetching markdown with jina...")
-        api_url = f"https://r.jina.ai/{url}"
-    else:
+from sitemap_ingest import find_sitemap_urls, iter_sitemap_urls
+from host_scheduler import HostScheduler, RobotsCache
+from crawl_utils import RETRY_STATUSES, backoff_delay, get_retry_after, write_atomic
+from url_filter import UrlFilter, add_filter_arguments, filter_from_args
+
+# Endpoint and default request rate (requests per second, burst) for each scraper backend
+SCRAPERS = {
+    'dhr': ("https://md.dhr.wtf/?url={url}", 5.0, 5),
+    'jina': ("https://r.jina.ai/{url}", 0.33, 3),
+}
+
+async def fetch_markdown(session, scraper, url, scheduler, retries=3, backoff=2.0):
+    if scraper not in SCRAPERS:
         raise ValueError("Unsupported scraper")
-
-    response = requests.get(api_url)
-    if response.status_code == 200:
-        return response.text
-    else:
-        print(f"Failed to fetch markdown for {url}")
-        return None
+    api_url = SCRAPERS[scraper][0].format(url=url)
+
+    for attempt in range(retries + 1):
+        await scheduler.acquire_async(api_url)
+        print(f"Fetching markdown with {scraper}...")
+        delay = backoff_delay(backoff, attempt)
+        request_start = time.monotonic()
+        status, retry_after = None, None
+        try:
+            async with session.get(api_url) as response:
+                status = response.status
+                if response.status == 200:
+                    return await response.text()
+                if response.status not in RETRY_STATUSES:
+                    break
+                # Honour the backend's own Retry-After when it sends one
+                retry_after = get_retry_after(response.headers)
+                if retry_after:
+                    delay = max(delay, retry_after)
+                print(f"{scraper} answered {response.status} for {url}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            print(f"Request to {scraper} for {url} failed: {e}")
+        finally:
+            scheduler.release(api_url, status, time.monotonic() - request_start, retry_after)
+        if attempt < retries:
+            await asyncio.sleep(delay)
+
+    print(f"Failed to fetch markdown for {url}")
+    return None
 
 def extract_urls_from_markdown(markdown_content):
     # Convert Markdown to HTML
     md = MarkdownIt()
     html_content = md.render(markdown_content)
-    
+
     # Parse HTML to extract URLs
     soup = BeautifulSoup(html_content, 'html.parser')
     return set(a['href'] for a in soup.find_all('a', href=True))
@@ -49,89 +78,157 @@ def save_markdown(url, markdown_content, base_dir):
     with open(filename, 'w', encoding='utf-8') as f:
         f.write(markdown_content)
 
-def scrape_site(url, scraper, base_dir, scraped_urls):
-    urls_to_scrape = {url}
-
-    while urls_to_scrape:
-        current_url = urls_to_scrape.pop()
-        if current_url in scraped_urls:
-            continue
-        if url not in current_url:
-            continue
-
-        print(f"Scraping {current_url}...")
-        markdown_content = fetch_markdown(scraper, current_url)
-        if markdown_content:
-            save_markdown(current_url, markdown_content, base_dir)
-            new_urls = extract_urls_from_markdown(markdown_content)
-            urls_to_scrape.update(new_urls)
-        
-        scraped_urls.add(current_url)
-
-def fetch_all_sitemap_urls(base_url):
-    def get_sitemap_urls_recursive(sitemap_url, collected_urls):
-        response = requests.get(sitemap_url)
-        if response.status_code == 200:
-            soup = BeautifulSoup(response.content, 'lxml-xml')
-            # Check if it's a sitemap index
-            sitemap_tags = soup.find_all('sitemap')
-            if sitemap_tags:
-                print(f"Found sitemap index: {sitemap_url}")
-                # Recursively handle sitemap index
-                for sitemap in sitemap_tags:
-                    child_sitemap_url = sitemap.find('loc').text
-                    get_sitemap_urls_recursive(child_sitemap_url, collected_urls)
+class ScrapeQueue:
+    """
+    Work queue for scrape_site that survives restarts.
+    Each entry is (url, scope): links found on a page are only followed when
+    they start with the scope of the seed that led to it, and pass
+    `url_filter`. Scraped URLs, the pending entries, the filtered
+    (url, scope) pairs and the filter's budgets are saved to `state_path`
+    every `save_every` pages.
+    """
+
+    def __init__(self, state_path, save_every=25, url_filter=None):
+        self.state_path = state_path
+        self.save_every = save_every
+        self.url_filter = url_filter or UrlFilter()
+        self.queue = asyncio.Queue()
+        self.pending = {}
+        self.scraped_urls = set()
+        self.filtered = set()
+        self.pages_since_save = 0
+
+    def load(self):
+        if not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path) as f:
+            state = json.load(f)
+        self.scraped_urls = set(state["scraped"])
+        self.filtered = {tuple(pair) for pair in state.get("filtered", ())}
+        if "url_filter" in state:
+            self.url_filter.load(state["url_filter"])
+        # Pending URLs passed the filter before, and their budgets were restored with it
+        for url, scope in state["pending"]:
+            self.pending[url] = scope
+            self.queue.put_nowait((url, scope))
+        return True
+
+    def add(self, url, scope):
+        if url in self.scraped_urls or url in self.pending or (url, scope) in self.filtered:
+            return False
+        if not self.url_filter.allow(url, scope):
+            # Whether a URL is in scope depends on the seed, so the pair is remembered
+            self.filtered.add((url, scope))
+            return False
+        self.pending[url] = scope
+        self.queue.put_nowait((url, scope))
+        return True
+
+    async def done(self, url):
+        self.pending.pop(url, None)
+        self.scraped_urls.add(url)
+        self.queue.task_done()
+        self.pages_since_save += 1
+        if self.pages_since_save >= self.save_every:
+            await self.save()
+
+    async def save(self):
+        self.pages_since_save = 0
+        state = {"scraped": sorted(self.scraped_urls), "pending": list(self.pending.items()), "filtered": sorted(self.filtered), "url_filter": self.url_filter.dump()}
+        await asyncio.to_thread(write_atomic, self.state_path, lambda f: json.dump(state, f))
+
+async def fetch_worker(session, scraper, scheduler, work, results):
+    while True:
+        url, scope = await work.queue.get()
+        markdown_content = None
+        try:
+            if await scheduler.allowed_async(url):
+                print(f"Scraping {url}...")
+                markdown_content = await fetch_markdown(session, scraper, url, scheduler)
             else:
-                # It's a regular sitemap with URLs
-                loc_tags = soup.find_all('loc')
-                for loc in loc_tags:
-                    url = loc.text
-                    collected_urls.add(url)
-        else:
-            print(f"Failed to fetch sitemap: {sitemap_url}")
-
-    # Start by fetching the initial sitemap
-    sitemap_urls = get_sitemap_urls(base_url)
-    all_urls = set()
-
-    for sitemap_url in sitemap_urls:
-        get_sitemap_urls_recursive(sitemap_url, all_urls)
-    
-    return all_urls
-
-def get_sitemap_urls(base_url):
-    sitemap_url = urljoin(base_url, '/sitemap.xml')
-    response = requests.get(sitemap_url)
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, 'lxml-xml')
-        return set(loc.text for loc in soup.find_all('loc'))
-    else:
-        print(f"Failed to fetch sitemap for {base_url}")
-        return set()
+                print(f"Skipping {url}: disallowed by robots.txt")
+        except Exception as e:
+            print(f"Failed to scrape {url}: {e}")
+        # Every URL reaches save_worker, which marks it done, or queue.join() never returns
+        await results.put((url, scope, markdown_content))
+
+async def save_worker(base_dir, work, results):
+    # Writing and link extraction run here so slow disks never hold up fetching
+    while True:
+        url, scope, markdown_content = await results.get()
+        try:
+            if markdown_content:
+                await asyncio.to_thread(save_markdown, url, markdown_content, base_dir)
+                for new_url in extract_urls_from_markdown(markdown_content):
+                    work.add(new_url, scope)
+        except Exception as e:
+            print(f"Failed to save {url}: {e}")
+        finally:
+            await work.done(url)
+
+async def feed_sitemap_urls(base_url, work, max_pending=1000):
+    # Sitemap discovery uses blocking requests, so it stays off the event loop
+    urls = iter_sitemap_urls(await asyncio.to_thread(find_sitemap_urls, base_url))
+    sitemap_url_count = 0
+    try:
+        while True:
+            # Only pull more sitemap URLs once the backlog has drained a bit
+            while work.queue.qsize() >= max_pending:
+                await asyncio.sleep(0.1)
+            sitemap_url = await asyncio.to_thread(next, urls, None)
+            if sitemap_url is None:
+                break
+            sitemap_url_count += 1
+            # Each sitemap URL is its own scope, as when it was scraped on its own
+            work.add(sitemap_url, sitemap_url)
+    finally:
+        urls.close()
+    print(f"Found {sitemap_url_count} URLs in all sitemaps")
+
+async def scrape_site(base_url, scraper, base_dir, concurrency=4, rate=None, resume=False, respect_robots=True, url_filter=None):
+    os.makedirs(base_dir, exist_ok=True)
+    work = ScrapeQueue(os.path.join(base_dir, f".crawl2markdown_{scraper}_state.json"), url_filter=url_filter)
+    if resume and work.load():
+        print(f"Resuming: {len(work.scraped_urls)} pages scraped, {len(work.pending)} pending")
+    work.add(base_url, base_url)
+
+    # The scraper backend has a fixed request budget; robots.txt of the site
+    # being scraped decides which of its pages may be requested through it
+    template, default_rate, burst = SCRAPERS[scraper]
+    scheduler = HostScheduler(max_per_host=concurrency, robots=RobotsCache('*') if respect_robots else None)
+    scheduler.set_host_limits(template.format(url=''), rate or default_rate, burst)
+    results = asyncio.Queue(maxsize=concurrency * 2)
+
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(timeout=timeout) as session:
+        workers = [asyncio.create_task(fetch_worker(session, scraper, scheduler, work, results)) for _ in range(concurrency)]
+        workers.append(asyncio.create_task(save_worker(base_dir, work, results)))
+        try:
+            # Fetch and scrape from all sitemaps while the main site is being scraped
+            await feed_sitemap_urls(base_url, work)
+            await work.queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await work.save()
+    print(work.url_filter.summary())
 
 def main():
     parser = argparse.ArgumentParser(description='Scrape website to Markdown.')
     parser.add_argument('url', type=str, help='The URL to scrape.')
     parser.add_argument('-s', '--scraper', type=str, choices=['dhr', 'jina'], required=True, help='Which scraper to use.')
     parser.add_argument('-o', '--output', type=str, default='scrape', help='Output directory for scraped content.')
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='Requests to the scraper in flight at once (default: 4).')
+    parser.add_argument('--rate', type=float, help='Requests per second allowed to the scraper (default: dhr 5, jina 0.33).')
+    parser.add_argument('--resume', action='store_true', help='Continue from the saved queue of an interrupted run.')
+    parser.add_argument('--ignore-robots', action='store_true', help="Also scrape pages the site's robots.txt disallows.")
+    parser.add_argument('--exclude-translations', action='store_true', help='Skip translated pages, e.g. under /fr/ or /en-gb/.')
+    add_filter_arguments(parser)
     args = parser.parse_args()
 
-    base_url = args.url
-    scraper = args.scraper
-    base_dir = args.output
-
-    # Set to keep track of already scraped URLs
-    scraped_urls = set()
-
-    # Scrape the main site
-    scrape_site(base_url, scraper, base_dir, scraped_urls)
-
-    # Fetch and scrape from all sitemaps
-    all_sitemap_urls = fetch_all_sitemap_urls(base_url)
-    print(f"Found {len(all_sitemap_urls)} URLs in all sitemaps")
-    for sitemap_url in all_sitemap_urls:
-        if sitemap_url not in scraped_urls:
-            scrape_site(sitemap_url, scraper, base_dir, scraped_urls)
+    url_filter = filter_from_args(args, exclude_translations=args.exclude_translations)
+    asyncio.run(scrape_site(args.url, args.scraper, args.output, args.concurrency, args.rate, args.resume, not args.ignore_robots, url_filter))
 
 if __name__ == '__main__':
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,54 @@
+import math
+import time
+from contextlib import contextmanager
+
+PERCENTILES = (50, 95, 99)
+
+class StageTimer:
+    """Milliseconds spent in each stage of crawling one page, in the order the stages ran."""
+
+    def __init__(self):
+        self.timings = {}
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            self.timings[name] = round(self.timings.get(name, 0) + elapsed_ms, 1)
+
+def percentile(sorted_values, pct):
+    # Nearest-rank percentile; sorted_values must not be empty
+    rank = max(math.ceil(pct / 100 * len(sorted_values)), 1)
+    return sorted_values[rank - 1]
+
+def summarize_timings(pages):
+    """
+    p50/p95/p99 of every crawl stage and browser metric across an iterable
+    of sitemap entries. Entries reused by an incremental crawl only add
+    their revalidation time; their browser metrics are from an older crawl.
+    """
+    samples = {}
+    for page in pages:
+        if not page:
+            continue
+        for group in ('timings_ms',) if page.get("reused") else ('timings_ms', 'browser_timing'):
+            for name, value in (page.get(group) or {}).items():
+                if value is not None:
+                    samples.setdefault(f"{group}.{name}", []).append(value)
+
+    report = {}
+    for name, values in samples.items():
+        values.sort()
+        report[name] = {"count": len(values), "total": round(sum(values), 1)}
+        for pct in PERCENTILES:
+            report[name][f"p{pct}"] = percentile(values, pct)
+    return report
+
+def print_timing_report(report):
+    print(f"{'stage':<40}{'count':>8}{'p50':>10}{'p95':>10}{'p99':>10}{'total':>12}")
+    # Stages that cost the most in total come first
+    for name, stats in sorted(report.items(), key=lambda item: item[1]["total"], reverse=True):
+        print(f"{name:<40}{stats['count']:>8}{stats['p50']:>10}{stats['p95']:>10}{stats['p99']:>10}{stats['total']:>12}")
@@ -0,0 +1,30 @@
+import os
+import random
+import shutil
+
+# Statuses worth another attempt after backing off
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+def backoff_delay(backoff, attempt):
+    # Exponential backoff with jitter so retries to one host do not line up
+    return backoff * (2 ** attempt) * (1 + random.random())
+
+def get_retry_after(headers):
+    """Seconds asked for by a Retry-After header; only the delay-seconds form, an HTTP date is left to the backoff."""
+    retry_after = headers.get('Retry-After', '')
+    return int(retry_after) if retry_after.isdigit() else None
+
+def write_atomic(path, write, binary=False):
+    """
+    Call write(f) on a temporary file next to `path`, then move it into
+    place, so readers never see a half-written file even if the process is
+    killed mid-write. A file that is replaced keeps its permissions.
+    """
+    tmp_path = path + ".tmp"
+    with (open(tmp_path, 'wb') if binary else open(tmp_path, 'w', encoding='utf-8')) as f:
+        write(f)
+    try:
+        shutil.copymode(path, tmp_path)
+    except FileNotFoundError:
+        pass
+    os.replace(tmp_path, path)
@@ -3,7 +3,13 @@ import subprocess
 import json
 import time
 import os
-import sys
+import io
+import struct
+import argparse
+import sqlite3
+import threading
+import cProfile
+import functools
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
@@ -12,30 +18,267 @@ from webdriver_manager.chrome import ChromeDriverManager
 from selenium.common.exceptions import WebDriverException
 import hashlib
 import requests
-from requests.exceptions import ConnectionError, Timeout
-from selenium.common.exceptions import StaleElementReferenceException, NoSuchElementException
+from requests.adapters import HTTPAdapter
+from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
 import base64
 import html2text
 from urllib.parse import urlparse
-import xml.etree.ElementTree as ET
-from bs4 import BeautifulSoup
+import lxml.html
+import lxml.etree
+from sitemap_ingest import find_sitemap_urls, iter_sitemap_urls
+from crawl_timing import StageTimer, summarize_timings, print_timing_report
+from host_scheduler import HostScheduler, RobotsCache
+from url_canonical import UrlCanonicalizer, TRAILING_SLASH_RULES, canonical_host
+from url_filter import UrlFilter, add_filter_arguments, filter_from_args
+from visited_set import VISITED_SET_KINDS, ExactVisitedSet, create_visited_set
+from sitemap_output import PageLog, compact_page_log, iter_pages
+from crawl_utils import write_atomic
+from shared_frontier import SharedFrontier
+from near_duplicates import NearDuplicateIndex, simhash
 from webdriver_manager.core.os_manager import ChromeType
 import re
 import urllib.parse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3'
 
 # Create a session and add the cookie
 session = requests.Session()
 session.cookies.set('privacy-policy', '1,XXXXXXXXXXXXXXXXXXXXXX')
 
-def capture_full_page_screenshot(driver, screenshot_path):
+def capture_full_page_screenshot(driver):
     driver.execute_cdp_cmd("Page.enable", {})
     screenshot_data = driver.execute_cdp_cmd("Page.captureScreenshot", {"format": "png", "captureBeyondViewport": True})
-    screenshot_bytes = base64.b64decode(screenshot_data['data'])
+    return base64.b64decode(screenshot_data['data'])
+
+SCREENSHOT_FORMATS = {'png': 'png', 'webp': 'webp', 'jpeg': 'jpg'}
+
+# WebP cannot hold images taller or wider than this; long pages fall back to JPEG
+WEBP_MAX_DIMENSION = 16383
+
+def get_png_size(png_bytes):
+    # Width and height sit at a fixed offset in the PNG header (IHDR chunk)
+    return struct.unpack('>II', png_bytes[16:24])
+
+def encode_screenshot(png_bytes, image_format, quality, width=None):
+    from PIL import Image  # Only needed when screenshots are re-encoded or thumbnailed
+
+    with Image.open(io.BytesIO(png_bytes)) as image:
+        if width and image.width > width:
+            image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        if image_format == 'jpeg':
+            image = image.convert('RGB')
+        output = io.BytesIO()
+        image.save(output, format=image_format.upper(), quality=quality)
+        return output.getvalue()
+
+class ArtifactWriter:
+    """Content-addressed store for screenshots and page text, written from a background thread pool.
+
+    Every artifact is named after the sha256 of its content, so pages with
+    identical text or screenshots share one file and nothing needs to be
+    deduplicated after the crawl. Paths and hashes are returned straight away;
+    re-encoding and the writes themselves happen later, so crawl threads move
+    on to the next page. At most `max_pending` artifacts wait in memory, after
+    which callers block until the disk catches up.
+    """
+
+    def __init__(self, screenshot_dirs, text_dir, screenshot_format='png', quality=80, thumbnail_width=None, workers=2, max_pending=16):
+        # Screen width -> directory for that width's screenshots; the first width is the browser's own
+        self.screenshot_dirs = screenshot_dirs
+        self.widths = list(screenshot_dirs)
+        self.text_dir = text_dir
+        self.screenshot_format = screenshot_format
+        self.quality = quality
+        self.thumbnail_width = thumbnail_width
+        for screenshot_dir in screenshot_dirs.values():
+            os.makedirs(screenshot_dir, exist_ok=True)
+        os.makedirs(text_dir, exist_ok=True)
+        self.executor = ThreadPoolExecutor(max_workers=workers)
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.stored = set()
+        self.lock = threading.Lock()
+
+    def store(self, path, func, *args):
+        # Identical content gets the same name, so it is only written once
+        with self.lock:
+            if path in self.stored or os.path.exists(path):
+                return
+            self.stored.add(path)
+        self.submit(path, func, *args)
+
+    def submit(self, path, func, *args):
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(func, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda done: self.finished(path, done))
+        return future
+
+    def finished(self, path, future):
+        self.slots.release()
+        if future.exception() is not None:
+            print(f"Failed to write {path}: {future.exception()}")
+            with self.lock:
+                self.stored.discard(path)
+
+    def get_screenshot_format(self, height):
+        if self.screenshot_format == 'webp' and height > WEBP_MAX_DIMENSION:
+            return 'jpeg'
+        return self.screenshot_format
+
+    def save_screenshot(self, png_bytes, width=None):
+        screenshot_hash = hashlib.sha256(png_bytes).hexdigest()
+        base_path = os.path.join(self.screenshot_dirs[width or self.widths[0]], screenshot_hash)
+        width, height = get_png_size(png_bytes)
+        image_format = self.get_screenshot_format(height)
+        screenshot_path = f"{base_path}.{SCREENSHOT_FORMATS[image_format]}"
+        self.store(screenshot_path, self.write_screenshot, screenshot_path, png_bytes, image_format)
+
+        thumbnail_path = None
+        if self.thumbnail_width:
+            thumbnail_height = height * min(self.thumbnail_width / width, 1)
+            thumbnail_format = self.get_screenshot_format(thumbnail_height)
+            thumbnail_path = f"{base_path}_thumb.{SCREENSHOT_FORMATS[thumbnail_format]}"
+            self.store(thumbnail_path, self.write_screenshot, thumbnail_path, png_bytes, thumbnail_format, self.thumbnail_width)
+
+        return screenshot_path, thumbnail_path, screenshot_hash
+
+    def write_screenshot(self, path, png_bytes, image_format, width=None):
+        if image_format != 'png' or width:
+            png_bytes = encode_screenshot(png_bytes, image_format, self.quality, width)
+        self.write_bytes(path, png_bytes)
+
+    def write_bytes(self, path, data):
+        write_atomic(path, lambda f: f.write(data), binary=True)
+
+    def save_text(self, markdown_content):
+        # The page URL is not part of the file, so pages with the same text share it;
+        # sitemap.json maps each URL to its text
+        content = markdown_content.encode('utf-8')
+        text_hash = hashlib.sha256(content).hexdigest()
+        text_file_path = os.path.join(self.text_dir, f"{text_hash}.md")
+        self.store(text_file_path, self.write_bytes, text_file_path, content)
+        return text_file_path, text_hash
+
+    def close(self):
+        # Wait for everything still queued to reach the disk
+        self.executor.shutdown(wait=True)
+
+class NetworkMonitor:
+    """
+    Follows the Network.* CDP events Chrome writes to the performance log
+    for the page being loaded. `resolver_site` is the site the
+    no-third-party policy lets resolve (see resolver_site()), if any.
+    """
+
+    def __init__(self, driver, resolver_site=None):
+        self.driver = driver
+        self.resolver_site = resolver_site
+        # Request id -> URL of every request still open
+        self.in_flight = {}
+        self.document = None
+        self.blocked_requests = 0
+        self.last_activity = time.monotonic()
 
-    with open(screenshot_path, "wb") as file:
-        file.write(screenshot_bytes)
+    def reset(self):
+        # Drop events left over from the previous page
+        self.driver.get_log('performance')
+        self.in_flight.clear()
+        self.document = None
+        self.blocked_requests = 0
+        self.last_activity = time.monotonic()
 
-def wait_for_full_page_load(driver, timeout=30):
+    def poll(self):
+        for entry in self.driver.get_log('performance'):
+            message = json.loads(entry['message'])['message']
+            self.handle(message.get('method'), message.get('params', {}))
+
+    def handle(self, method, params):
+        request_id = params.get('requestId')
+        if method == 'Network.requestWillBeSent':
+            self.in_flight[request_id] = params.get('request', {}).get('url')
+        elif method == 'Network.responseReceived':
+            # The first Document response is the main frame's; iframes finish later
+            if self.document is None and params.get('type') == 'Document':
+                self.document = {
+                    "request_id": request_id,
+                    "status": params['response']['status'],
+                    "headers": params['response']['headers'],
+                    "encoded_size": None
+                }
+        elif method in ('Network.loadingFinished', 'Network.loadingFailed'):
+            url = self.in_flight.pop(request_id, None)
+            if method == 'Network.loadingFinished' and self.document is not None and request_id == self.document['request_id']:
+                self.document['encoded_size'] = params['encodedDataLength']
+            if method == 'Network.loadingFailed' and self.is_blocked(url, params):
+                self.blocked_requests += 1
+        elif method != 'Network.dataReceived':
+            return
+        self.last_activity = time.monotonic()
+
+    def is_blocked(self, url, params):
+        # setBlockedURLs reports a blockedReason. The no-third-party resolver
+        # rules make hosts outside the site fail to resolve, which a site's
+        # own missing hosts do as well, so only those outside it count.
+        if params.get('blockedReason'):
+            return True
+        if params.get('errorText') != 'net::ERR_NAME_NOT_RESOLVED' or not self.resolver_site or not url:
+            return False
+        return is_third_party(urlparse(url).hostname or '', self.resolver_site)
+
+WAIT_STRATEGIES = ('load', 'domcontentloaded', 'network-idle', 'selector')
+
+class WaitStrategy:
+    """
+    How get_page_details decides a page has finished loading.
+    Drivers navigate with the 'eager' page load strategy, so driver.get()
+    returns at DOMContentLoaded and everything after that is up to the strategy:
+    'load' waits for the load event, 'network-idle' waits until at most
+    max_in_flight requests are open and no network event has arrived for
+    idle_ms, and 'selector' waits for a CSS selector to match.
+    """
+
+    def __init__(self, name='network-idle', idle_ms=500, selector=None, timeout=30, max_in_flight=0):
+        if name not in WAIT_STRATEGIES:
+            raise ValueError(f"Unknown wait strategy: {name}")
+        if name == 'selector' and not selector:
+            raise ValueError("The selector wait strategy needs a selector")
+        self.name = name
+        self.idle_ms = idle_ms
+        self.selector = selector
+        self.timeout = timeout
+        self.max_in_flight = max_in_flight
+
+    def wait(self, driver, monitor):
+        """Wait for the page and return how long that took in milliseconds."""
+        start = time.monotonic()
+        if self.name == 'load':
+            wait_for_load_event(driver)
+        elif self.name == 'selector':
+            try:
+                WebDriverWait(driver, self.timeout).until(EC.presence_of_element_located((By.CSS_SELECTOR, self.selector)))
+            except TimeoutException:
+                print(f"Timed out waiting for {self.selector}")
+        elif self.name == 'network-idle':
+            self.wait_for_network_idle(monitor, start + self.timeout)
+        return int((time.monotonic() - start) * 1000)
+
+    def wait_for_network_idle(self, monitor, deadline):
+        while time.monotonic() < deadline:
+            monitor.poll()
+            quiet_ms = (time.monotonic() - monitor.last_activity) * 1000
+            if len(monitor.in_flight) <= self.max_in_flight and quiet_ms >= self.idle_ms:
+                return
+            time.sleep(min(0.05, self.idle_ms / 1000))
+        print(f"Network still busy after {self.timeout}s ({len(monitor.in_flight)} requests in flight)")
+
+def wait_for_load_event(driver):
     driver.execute_async_script("""
         var callback = arguments[arguments.length - 1];
         if (document.readyState === 'complete') {
@@ -45,26 +288,6 @@ def wait_for_full_page_load(driver, timeout=30):
         }
     """)
 
-    driver.execute_async_script("""
-        var callback = arguments[arguments.length - 1];
-        var maxTimeout = %d;
-        var checkInterval = 100;
-        var elapsed = 0;
-
-        function checkNetworkIdle() {
-            if (elapsed >= maxTimeout) {
-                callback();
-            } else if (performance.getEntriesByType('resource').some(e => !e.responseEnd)) {
-                setTimeout(checkNetworkIdle, checkInterval);
-                elapsed += checkInterval;
-            } else {
-                callback();
-            }
-        }
-
-        checkNetworkIdle();
-    """ % (timeout * 1000))
-
 def accept_cookies(driver):
     try:
         cookie_button = driver.find_element(By.CSS_SELECTOR, "button.accept-cookies")  # Update the selector as needed
@@ -72,179 +295,668 @@ def accept_cookies(driver):
     except NoSuchElementException:
         pass
 
-def convert_html_to_markdown(html_content):
-    h = html2text.HTML2Text()
+# Patterns used by convert_html_to_markdown, compiled once instead of per page
+NEXT_IMAGE_RE = re.compile(r'!\[(.*?)\]\((/_next/image\?.*?)\)')
+BLANK_LINES_RE = re.compile(r'\n{3,}')
+HEADER_SPACING_RE = re.compile(r'(\n#+.*)\n+')
+TRAILING_SPACES_RE = re.compile(r' +\n')
+
+def fix_image_url(match):
+    alt_text = match.group(1)
+    url = match.group(2)
+    decoded_url = urllib.parse.unquote(url)
+    # Extract the actual image URL from the query parameter
+    actual_url = urllib.parse.parse_qs(urllib.parse.urlparse(decoded_url).query).get('url', [None])[0]
+    if actual_url:
+        return f'![{alt_text}]({actual_url})'
+    else:
+        return f'![{alt_text}]({url})'
+
+class TreeToMarkdown(html2text.HTML2Text):
+    """
+    html2text's markdown rules, fed from an lxml tree instead of its own
+    pure-Python tokenizer, so pages are parsed once, by libxml2.
+    """
+
+    def handle_tree(self, element):
+        self.start = True
+        for event, node in lxml.etree.iterwalk(element, events=('start', 'end', 'comment', 'pi')):
+            if event == 'start':
+                self.handle_starttag(node.tag, list(node.attrib.items()))
+                if node.text:
+                    self.handle_data(node.text)
+                continue
+            # Void elements such as <br> never get an end tag from html.parser either
+            if event == 'end' and node.tag not in lxml.html.defs.empty_tags:
+                self.handle_endtag(node.tag)
+            if node.tail:
+                self.handle_data(node.tail)
+        return self.optwrap(self.finish())
+
+def convert_html_to_markdown(content):
+    """Markdown for an lxml element, or for an HTML string such as the extraction script returns."""
+    if isinstance(content, str):
+        content = lxml.html.document_fromstring(content).body
+    h = TreeToMarkdown()
     h.body_width = 0  # Disable line wrapping
-    markdown_content = h.handle(html_content)
-    
+    return tidy_markdown(h.handle_tree(content))
+
+def tidy_markdown(markdown_content):
     # Remove extra newlines between URL and its text
     markdown_content = markdown_content.replace(']\n(', '](')
     
     # Fix image URLs
-    def fix_image_url(match):
-        alt_text = match.group(1)
-        url = match.group(2)
-        decoded_url = urllib.parse.unquote(url)
-        # Extract the actual image URL from the query parameter
-        actual_url = urllib.parse.parse_qs(urllib.parse.urlparse(decoded_url).query).get('url', [None])[0]
-        if actual_url:
-            return f'![{alt_text}]({actual_url})'
-        else:
-            return f'![{alt_text}]({url})'
-
-    markdown_content = re.sub(r'!\[(.*?)\]\((/_next/image\?.*?)\)', fix_image_url, markdown_content)
+    markdown_content = NEXT_IMAGE_RE.sub(fix_image_url, markdown_content)
     
     # Remove multiple consecutive blank lines
-    markdown_content = re.sub(r'\n{3,}', '\n\n', markdown_content)
+    markdown_content = BLANK_LINES_RE.sub('\n\n', markdown_content)
     
     # Ensure proper spacing around headers
-    markdown_content = re.sub(r'(\n#+.*)\n+', r'\1\n\n', markdown_content)
+    markdown_content = HEADER_SPACING_RE.sub(r'\1\n\n', markdown_content)
     
     # Remove spaces before newlines
-    markdown_content = re.sub(r' +\n', '\n', markdown_content)
+    markdown_content = TRAILING_SPACES_RE.sub('\n', markdown_content)
     
     return markdown_content
 
-def extract_text_from_page(driver, url, text_dir):
-    driver.get(url)
-    wait_for_full_page_load(driver)
-    accept_cookies(driver)
-    
-    # Get the full HTML content
-    html_content = driver.page_source
-    
-    # Parse the HTML with BeautifulSoup
-    soup = BeautifulSoup(html_content, 'html.parser')
-    
-    # Find the main content
-    main_content = soup.find('main')
-    
-    if main_content:
-        # Remove header and footer if they exist within main
-        for tag in main_content.find_all(['header', 'footer']):
-            tag.decompose()
-        
-        # Convert the main content to markdown
-        markdown_content = convert_html_to_markdown(str(main_content))
-    else:
-        # If no main tag is found, use the body content as fallback
-        body_content = soup.find('body')
-        if body_content:
-            # Remove header and footer from body
-            for tag in body_content.find_all(['header', 'footer']):
-                tag.decompose()
-            markdown_content = convert_html_to_markdown(str(body_content))
+# Runs inside the page: one round trip returns the main content, without its
+# header and footer, and every link already resolved by the browser
+EXTRACT_PAGE_SCRIPT = """
+    var content = document.querySelector('main') || document.body;
+    var html = null;
+    if (content) {
+        content = content.cloneNode(true);
+        content.querySelectorAll('header, footer').forEach(function (tag) { tag.remove(); });
+        html = content.outerHTML;
+    }
+    var hrefs = [];
+    document.querySelectorAll('a[href]').forEach(function (link) {
+        if (typeof link.href === 'string' && link.href.startsWith('http')) {
+            hrefs.push(link.href);
+        }
+    });
+    return {html: html, hrefs: hrefs};
+"""
+
+def extract_text_from_page(driver, artifacts, timer):
+    # Works on the page that is already loaded in the driver
+    with timer.stage('extract'):
+        extracted = driver.execute_script(EXTRACT_PAGE_SCRIPT)
+    with timer.stage('convert'):
+        if extracted['html']:
+            markdown_content = convert_html_to_markdown(extracted['html'])
         else:
             markdown_content = "No content found"
+        text_file_path, text_hash = artifacts.save_text(markdown_content)
+    with timer.stage('simhash'):
+        fingerprint = simhash(markdown_content)
+    with timer.stage('link_harvest'):
+        hrefs = set(extracted['hrefs'])
+    return text_file_path, text_hash, fingerprint, hrefs
+
+def find_main_content(document):
+    """<main> (or <body>) of a parsed lxml document, with its header and footer removed."""
+    content = document.find('.//main')
+    if content is None:
+        content = document.find('.//body')
+    if content is None:
+        return None
+    # Remove header and footer if they exist within the content
+    for tag in content.xpath('.//header|.//footer'):
+        tag.drop_tree()
+    return content
+
+def extract_main_html(document):
+    """The HTML of find_main_content(document), or None."""
+    content = find_main_content(document)
+    return None if content is None else lxml.html.tostring(content, encoding='unicode')
+
+def get_response_body_hash(driver, request_id):
+    try:
+        body = driver.execute_cdp_cmd("Network.getResponseBody", {"requestId": request_id})
+    except WebDriverException:
+        return None
+    content = base64.b64decode(body['body']) if body.get('base64Encoded') else body['body'].encode('utf-8')
+    return hashlib.sha256(content).hexdigest()
 
-    # Add the source line at the top of the markdown content
-    markdown_content = f"[source]({url})\n\n{markdown_content}"
+def capture_viewport(driver, artifacts, width=None):
+    dimensions = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
+    screenshot_path, thumbnail_path, screenshot_hash = artifacts.save_screenshot(capture_full_page_screenshot(driver), width)
+    return {
+        "screenshot_path": screenshot_path,
+        "thumbnail_path": thumbnail_path,
+        "screenshot_hash": screenshot_hash,
+        "full_width": dimensions['contentSize']['width'],
+        "full_height": dimensions['contentSize']['height'],
+    }
 
-    # Create the file path
-    text_file_path = os.path.join(text_dir, f"{url.replace('https://', '').replace('http://', '').replace('/', '_')}.md")
+def capture_other_viewports(driver, artifacts, wait_strategy, monitor):
+    # The page is already loaded; it is only laid out again at each width
+    viewports = {}
+    try:
+        for width in artifacts.widths[1:]:
+            driver.execute_cdp_cmd("Emulation.setDeviceMetricsOverride", {"width": int(width), "height": 1080, "deviceScaleFactor": 0, "mobile": False})
+            if wait_strategy.name == 'network-idle':
+                # Responsive images for the new width may still be loading
+                wait_strategy.wait_for_network_idle(monitor, time.monotonic() + wait_strategy.timeout)
+            viewports[width] = capture_viewport(driver, artifacts, width)
+    finally:
+        driver.execute_cdp_cmd("Emulation.clearDeviceMetricsOverride", {})
+    return viewports
 
-    # Write the markdown content to the file
-    with open(text_file_path, "w", encoding='utf-8') as file:
-        file.write(markdown_content)
+# Navigation Timing and Largest Contentful Paint for the loaded page, in
+# milliseconds since navigation started. LCP entries are buffered, so the
+# observer reports them at once; pages without any resolve after 100ms.
+BROWSER_TIMING_SCRIPT = """
+new Promise(function (resolve) {
+    var nav = performance.getEntriesByType('navigation')[0];
+    var metrics = {};
+    if (nav) {
+        metrics.dns_ms = nav.domainLookupEnd - nav.domainLookupStart;
+        metrics.connect_ms = nav.connectEnd - nav.connectStart;
+        metrics.ttfb_ms = nav.responseStart - nav.startTime;
+        metrics.response_ms = nav.responseEnd - nav.responseStart;
+        metrics.dom_interactive_ms = nav.domInteractive - nav.startTime;
+        metrics.dom_content_loaded_ms = nav.domContentLoadedEventEnd - nav.startTime;
+        metrics.load_event_ms = nav.loadEventEnd > 0 ? nav.loadEventEnd - nav.startTime : null;
+    }
+    var done = false;
+    function finish(lcp) {
+        if (!done) {
+            done = true;
+            metrics.lcp_ms = lcp;
+            resolve(metrics);
+        }
+    }
+    try {
+        new PerformanceObserver(function (list) {
+            var entries = list.getEntries();
+            finish(entries[entries.length - 1].startTime);
+        }).observe({type: 'largest-contentful-paint', buffered: true});
+    } catch (e) {}
+    setTimeout(function () { finish(null); }, 100);
+})
+"""
 
-    return text_file_path
+def get_browser_timing(driver):
+    try:
+        result = driver.execute_cdp_cmd("Runtime.evaluate", {"expression": BROWSER_TIMING_SCRIPT, "awaitPromise": True, "returnByValue": True})
+    except WebDriverException:
+        return None
+    metrics = result.get('result', {}).get('value') or {}
+    return {name: round(value, 1) if value is not None else None for name, value in metrics.items()}
 
-def get_page_details(driver, url, screenshot_dir, text_dir):
+def get_page_details(driver, url, artifacts, wait_strategy=None, resolver_site=None):
+    wait_strategy = wait_strategy or WaitStrategy()
+    monitor = NetworkMonitor(driver, resolver_site)
+    monitor.reset()
+
+    timer = StageTimer()
     start_time = time.time()
-    driver.get(url)
-    wait_for_full_page_load(driver)
-    accept_cookies(driver)
+    with timer.stage('navigate'):
+        driver.get(url)
+    with timer.stage('wait'):
+        wait_time = wait_strategy.wait(driver, monitor)
+        accept_cookies(driver)
     load_time = int((time.time() - start_time) * 1000)
+    browser_timing = get_browser_timing(driver)
 
-    driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+    with timer.stage('screenshot'):
+        driver.execute_script("window.scrollTo(0, document.body.scrollHeight);")
+        viewport = capture_viewport(driver, artifacts)
 
-    dimensions = driver.execute_cdp_cmd("Page.getLayoutMetrics", {})
-    full_width = dimensions['contentSize']['width']
-    full_height = dimensions['contentSize']['height']
+    text_file_path, text_hash, text_simhash, hrefs = extract_text_from_page(driver, artifacts, timer)
 
-    screenshot_path = os.path.join(screenshot_dir, f"{url.replace('https://', '').replace('http://', '').replace('/', '_')}.png")
-    capture_full_page_screenshot(driver, screenshot_path)
+    page = {
+        "page_load_time_ms": load_time,
+        "wait_time_ms": wait_time,
+        "http_status_code": None,
+        "content_size_mb": None,
+        "screenshot_path": viewport["screenshot_path"],
+        "thumbnail_path": viewport["thumbnail_path"],
+        "screenshot_hash": viewport["screenshot_hash"],
+        "text_file_path": text_file_path,
+        "text_hash": text_hash,
+        "simhash": text_simhash,
+        "full_width": viewport["full_width"],
+        "full_height": viewport["full_height"],
+        "links": sorted(hrefs)
+    }
+    # Every width gets its own block; the top-level fields above are the first width's
+    page["viewports"] = {artifacts.widths[0]: viewport}
+    with timer.stage('screenshot'):
+        page["viewports"].update(capture_other_viewports(driver, artifacts, wait_strategy, monitor))
+    page["timings_ms"] = timer.timings
+    page["browser_timing"] = browser_timing
+    fingerprint = {}
 
-    text_file_path = extract_text_from_page(driver, url, text_dir)
+    # Status and size come from the browser's own load of the page instead
+    # of downloading it again
+    with timer.stage('status_fetch'):
+        monitor.poll()
+    page["blocked_requests"] = monitor.blocked_requests
+    response = monitor.document
+    if response is None:
+        print(f"No document response recorded for {url}")
+        return page, fingerprint
 
-    links = driver.find_elements(By.TAG_NAME, 'a')
-    hrefs = set()  # Use a set to store unique hrefs
-    for link in links:
-        try:
-            href = link.get_attribute('href')
-            if href is not None and href.startswith('http'):
-                hrefs.add(href)
-        except StaleElementReferenceException:
-            continue
-
-    # Retry mechanism for the request
-    retries = 3
-    for attempt in range(retries):
+    page["http_status_code"] = response['status']
+    if response['encoded_size'] is not None:
+        page["content_size_mb"] = response['encoded_size'] / (1024 * 1024)
+
+    # Log any "Set-Cookie" headers
+    headers = {name.lower(): value for name, value in response['headers'].items()}
+    if 'set-cookie' in headers:
+        print(f"Set-Cookie headers from {url}: {headers['set-cookie']}")
+
+    fingerprint.update(get_validators(headers))
+    with timer.stage('status_fetch'):
+        fingerprint["content_hash"] = get_response_body_hash(driver, response['request_id'])
+    return page, fingerprint
+
+# Element ids used as the mount point by common client-side frameworks
+SPA_ROOT_IDS = ('root', 'app', '__next', '__nuxt', '___gatsby')
+
+class HttpEngine:
+    """Fetches pages with plain HTTP; Chrome is only started for pages that need JavaScript.
+
+    One engine is used per crawl worker. The requests session (and its
+    connection pool) is shared between engines, the fallback driver is not.
+    """
+
+    def __init__(self, http_session, screen_width, js_fallback=False, resource_policy='full', base_domain=None, recycle_after=500, max_rss_mb=None):
+        self.session = http_session
+        self.js_fallback = js_fallback
+        # Started the first time a page needs JavaScript
+        self.chrome = ManagedDriver(screen_width, resource_policy, base_domain, recycle_after, max_rss_mb)
+
+    def get_driver(self):
+        return self.chrome.get()
+
+    def recover(self):
+        return self.chrome.driver is not None and self.chrome.recover()
+
+    def quit(self):
+        self.chrome.quit()
+
+def create_http_session(pool_size):
+    http_session = requests.Session()
+    http_session.cookies.update(session.cookies)
+    http_session.headers['User-Agent'] = USER_AGENT
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    http_session.mount('http://', adapter)
+    http_session.mount('https://', adapter)
+    return http_session
+
+def needs_javascript(document):
+    # An empty <main>, or an empty framework mount point, means the HTML is
+    # only a shell that scripts fill in
+    content = document.find('.//main')
+    if content is not None and not content.text_content().strip():
+        return True
+    for root_id in SPA_ROOT_IDS:
+        for element in document.xpath(f'//*[@id="{root_id}"]'):
+            if not element.text_content().strip():
+                return True
+    return False
+
+def get_page_details_http(engine, url, artifacts, wait_strategy=None):
+    timer = StageTimer()
+    start_time = time.time()
+    with timer.stage('navigate'):
+        response = engine.session.get(url, timeout=30)
+    load_time = int((time.time() - start_time) * 1000)
+
+    page = {
+        "page_load_time_ms": load_time,
+        "http_status_code": response.status_code,
+        "content_size_mb": len(response.content) / (1024 * 1024),
+        "screenshot_path": None,
+        "thumbnail_path": None,
+        "screenshot_hash": None,
+        "text_file_path": None,
+        "text_hash": None,
+        "simhash": None,
+        "full_width": None,
+        "full_height": None,
+        "links": [],
+        "viewports": {},
+        "timings_ms": timer.timings,
+        "browser_timing": None
+    }
+    fingerprint = get_validators(response.headers)
+    fingerprint["content_hash"] = hashlib.sha256(response.content).hexdigest()
+
+    if 'html' not in response.headers.get('Content-Type', ''):
+        return page, fingerprint
+
+    with timer.stage('extract'):
+        document = lxml.html.fromstring(response.content, base_url=response.url)
+        document.make_links_absolute(resolve_base_href=True, handle_failures='discard')
+
+    if engine.js_fallback and needs_javascript(document):
+        print(f"Rendering {url} in Chrome: page needs JavaScript")
+        return get_page_details(engine.get_driver(), url, artifacts, wait_strategy, engine.chrome.resolver_site)
+
+    with timer.stage('link_harvest'):
+        hrefs = {href for href in document.xpath('//a/@href') if href.startswith('http')}
+
+    with timer.stage('extract'):
+        content = find_main_content(document)
+    with timer.stage('convert'):
+        markdown_content = convert_html_to_markdown(content) if content is not None else "No content found"
+        page["text_file_path"], page["text_hash"] = artifacts.save_text(markdown_content)
+    with timer.stage('simhash'):
+        page["simhash"] = simhash(markdown_content)
+    page["links"] = sorted(hrefs)
+
+    return page, fingerprint
+
+def get_validators(headers):
+    # Header names from CDP keep the server's casing; requests' are case-insensitive
+    headers = {name.lower(): value for name, value in headers.items()}
+    return {"etag": headers.get('etag'), "last_modified": headers.get('last-modified')}
+
+class CrawlManifest:
+    """
+    Per-domain record of each URL's validators, content hash and sitemap
+    entry from earlier crawls. Records live in SQLite and are read one URL
+    at a time, so the crawl holds none of them in memory. Updates are
+    committed every `commit_every` pages and by save().
+    """
+
+    def __init__(self, path, incremental=False, commit_every=100):
+        self.path = path
+        # Records are always kept up to date; they are only trusted to skip pages when incremental
+        self.incremental = incremental
+        self.commit_every = commit_every
+        self.uncommitted = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS records (url TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, content_hash TEXT, page TEXT NOT NULL)")
+
+    def get(self, url):
+        with self.lock:
+            row = self.db.execute("SELECT etag, last_modified, content_hash, page FROM records WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, content_hash, page = row
+        return {"etag": etag, "last_modified": last_modified, "content_hash": content_hash, "page": json.loads(page)}
+
+    def update(self, url, page, fingerprint):
+        record = (url, fingerprint.get("etag"), fingerprint.get("last_modified"), fingerprint.get("content_hash"), json.dumps(page))
+        with self.lock:
+            self.db.execute("INSERT OR REPLACE INTO records (url, etag, last_modified, content_hash, page) VALUES (?, ?, ?, ?, ?)", record)
+            self.uncommitted += 1
+            if self.uncommitted >= self.commit_every:
+                self.db.commit()
+                self.uncommitted = 0
+
+    def save(self):
+        with self.lock:
+            self.db.commit()
+            self.uncommitted = 0
+
+    def close(self):
+        self.save()
+        self.db.close()
+
+def page_unchanged(http_session, url, record, widths=()):
+    page = record["page"]
+    # Without its artifacts the previous entry is useless
+    viewports = page.get("viewports", {})
+    paths = [page.get("screenshot_path"), page.get("text_file_path")]
+    paths += [viewport.get("screenshot_path") for viewport in viewports.values()]
+    for path in paths:
+        if path and not os.path.exists(path):
+            return False
+    # Nor is a screenshot entry that lacks one of the widths asked for now
+    if page.get("screenshot_path") and not all(width in viewports for width in widths):
+        return False
+
+    headers = {}
+    if record.get("etag"):
+        headers['If-None-Match'] = record["etag"]
+    if record.get("last_modified"):
+        headers['If-Modified-Since'] = record["last_modified"]
+
+    response = http_session.get(url, headers=headers, timeout=30)
+    if response.status_code == 304:
+        return True
+    # Servers without validators still let us compare the body itself
+    return response.status_code == 200 and record.get("content_hash") == hashlib.sha256(response.content).hexdigest()
+
+def crawl_page(driver, url, artifacts, manifest=None, wait_strategy=None):
+    http_session = driver.session if isinstance(driver, HttpEngine) else session
+    record = manifest.get(url) if manifest and manifest.incremental else None
+    try:
+        if record:
+            timer = StageTimer()
+            with timer.stage('revalidate'):
+                unchanged = page_unchanged(http_session, url, record, artifacts.widths)
+            if unchanged:
+                print(f"Unchanged {url}, reusing previous entry")
+                # The stored timings belong to the crawl that rendered the page
+                return {**record["page"], "timings_ms": timer.timings, "reused": True}
+    except requests.RequestException as e:
+        print(f"Conditional request for {url} failed: {e}")
+
+    print(f"Crawling {url}...")
+    for attempt in range(2):
         try:
-            response = session.get(url)  # Use the session with the cookie
-            content_size = len(response.content) / (1024 * 1024)
-            http_status_code = response.status_code
-
-            # Log any "Set-Cookie" headers
-            if 'Set-Cookie' in response.headers:
-                print(f"Set-Cookie headers from {url}: {response.headers['Set-Cookie']}")
-
-            return sorted(hrefs), load_time, http_status_code, content_size, screenshot_path, text_file_path, full_width, full_height
-        except (ConnectionError, Timeout) as e:
-            print(f"Attempt {attempt + 1} failed: {e}")
-            time.sleep(2 ** attempt)  # Exponential backoff
-        except Exception as e:
-            print(f"An unexpected error occurred: {e}")
+            if isinstance(driver, HttpEngine):
+                page, fingerprint = get_page_details_http(driver, url, artifacts, wait_strategy)
+            else:
+                page, fingerprint = get_page_details(driver.get(), url, artifacts, wait_strategy, driver.resolver_site)
             break
+        except (WebDriverException, requests.RequestException) as e:
+            # Retried once in a fresh browser if Chrome itself died, so the
+            # page and everything only it links to are not lost
+            if attempt == 0 and isinstance(e, WebDriverException) and driver.recover():
+                print(f"Chrome stopped responding on {url}, retrying in a new browser")
+                continue
+            if 'net::ERR_CONNECTION_REFUSED' in str(e):
+                print(f"Failed to crawl {url}: Connection refused.")
+            else:
+                print(f"Failed to crawl {url}: {e}")
+            return None
 
-    # If all retries fail, return default values
-    return sorted(hrefs), load_time, None, None, screenshot_path, text_file_path, full_width, full_height
+    if manifest:
+        manifest.update(url, page, fingerprint)
+    return page
 
-def crawl_site(driver, url, screenshot_dir, text_dir, base_domain, max_depth=2, current_depth=0, visited=None, exclude_translations=False):
-    if visited is None:
-        visited = set()
-    if current_depth > max_depth or url in visited:
-        return {}
+class CrawlFrontier:
+    """Breadth-first crawl frontier shared by every driver in a crawl.
 
-    parsed_url = urlparse(url)
-    if not (parsed_url.netloc == base_domain or parsed_url.netloc.endswith('.' + base_domain)):
-        return {}
+    Each queued URL carries its own depth, so there is no recursion and no
+    per-level copying of site maps. URLs pass through ``canonicalize`` before
+    anything else, so variants of one page are only crawled once, and new
+    ones must then pass ``url_filter`` (by default: on the site, and not
+    translated if ``exclude_translations`` is set). A URL is offered to
+    the filter once; filtered URLs stay in the visited set. Finished
+    pages go to ``page_log`` when there is one, and are kept in ``site_map``
+    otherwise. The visited set, the pending queue and the in-memory site map
+    are written to ``state_path`` every ``checkpoint_every`` pages, which is
+    what ``--resume`` picks up from.
+    """
 
-    # Check if the URL should be excluded based on translation
-    if exclude_translations and is_translated_url(parsed_url.path):
-        print(f"Skipping translated page: {url}")
-        return {}
+    def __init__(self, base_domain, max_depth=2, exclude_translations=False, state_path=None, checkpoint_every=50, source_buffer=1000, canonicalize=None, visited=None, page_log=None, near_duplicates=None, url_filter=None):
+        self.base_domain = base_domain
+        self.max_depth = max_depth
+        self.url_filter = url_filter or UrlFilter(base_domain, exclude_translations)
+        self.state_path = state_path
+        self.checkpoint_every = checkpoint_every
+        self.queue = deque()
+        self.in_progress = {}
+        self.canonicalize = canonicalize
+        self.visited = visited if visited is not None else ExactVisitedSet()
+        self.site_map = {}
+        self.page_log = page_log
+        self.near_duplicates = near_duplicates
+        self.pages_done = 0
+        self.pages_since_checkpoint = 0
+        # One checkpoint is written at a time, so an older one never replaces a newer one
+        self.checkpoint_lock = threading.Lock()
+        self.source_buffer = source_buffer
+        self.active_sources = 0
+        self.condition = threading.Condition()
 
-    visited.add(url)
-    print(f"Crawling {url}...")
-    try:
-        links, load_time, http_status_code, content_size, screenshot_path, text_file_path, full_width, full_height = get_page_details(driver, url, screenshot_dir, text_dir)
-    except WebDriverException as e:
-        if 'net::ERR_CONNECTION_REFUSED' in str(e):
-            print(f"Failed to crawl {url}: Connection refused.")
-        else:
+    def admit(self, url, depth):
+        if self.canonicalize:
+            url = self.canonicalize(url)
+        with self.condition:
+            if depth > self.max_depth or url in self.visited:
+                return False
+            # A filtered URL is marked visited too, so later links to it are
+            # neither checked nor counted again
+            self.visited.add(url)
+            if not self.url_filter.allow(url):
+                return False
+            self.queue.append((url, depth))
+            self.condition.notify_all()
+            return True
+
+    def add_source(self, urls, depth):
+        # Admits URLs from an iterator only while the queue is short, so a
+        # multi-million URL sitemap is never held in memory at once
+        def feed():
+            try:
+                for url in urls:
+                    with self.condition:
+                        while len(self.queue) >= self.source_buffer:
+                            self.condition.wait()
+                    self.admit(url, depth)
+            finally:
+                with self.condition:
+                    self.active_sources -= 1
+                    self.condition.notify_all()
+
+        with self.condition:
+            self.active_sources += 1
+        threading.Thread(target=feed, daemon=True).start()
+
+    def next(self):
+        """Block until a URL is available; return None once the crawl is finished."""
+        with self.condition:
+            while not self.queue and (self.in_progress or self.active_sources):
+                self.condition.wait()
+            if not self.queue:
+                return None
+            url, depth = self.queue.popleft()
+            self.in_progress[url] = depth
+            # Wake a source waiting for room in the queue
+            self.condition.notify_all()
+            return url, depth
+
+    def complete(self, url, page):
+        with self.condition:
+            depth = self.in_progress.pop(url)
+            if page is not None:
+                if self.page_log:
+                    self.page_log.write(url, page)
+                else:
+                    self.site_map[url] = page
+                self.pages_done += 1
+                if expand_links(self.near_duplicates, url, page):
+                    for link in page["links"]:
+                        # The condition wraps an RLock, so admit() can re-enter it
+                        self.admit(link, depth + 1)
+            self.pages_since_checkpoint += 1
+            checkpoint_due = self.state_path and self.pages_since_checkpoint >= self.checkpoint_every
+            if checkpoint_due:
+                self.pages_since_checkpoint = 0
+            self.condition.notify_all()
+        if checkpoint_due:
+            self.checkpoint()
+
+    def checkpoint(self):
+        with self.checkpoint_lock:
+            # Only copies are taken under the frontier's lock; encoding and
+            # writing them, which takes seconds at a million URLs, is not
+            with self.condition:
+                # Pages that were being rendered go back on the queue so a resumed
+                # crawl renders them again.
+                state = {
+                    "max_depth": self.max_depth,
+                    "queue": list(self.in_progress.items()) + list(self.queue),
+                    "visited": self.visited.dump(),
+                    "pages_done": self.pages_done,
+                    "url_filter": self.url_filter.dump(),
+                    "site_map": dict(self.site_map)
+                }
+                self.pages_since_checkpoint = 0
+            # A hashed visited set dumps an array of keys, listed here
+            write_atomic(self.state_path, lambda f: json.dump(state, f, default=list))
+
+    def load(self):
+        if not self.state_path or not os.path.exists(self.state_path):
+            return False
+        with open(self.state_path) as f:
+            state = json.load(f)
+        with self.condition:
+            self.max_depth = state.get("max_depth", self.max_depth)
+            self.queue = deque((url, depth) for url, depth in state["queue"])
+            self.visited.load(state["visited"])
+            self.site_map = state["site_map"]
+            self.pages_done = state.get("pages_done", len(self.site_map))
+            if "url_filter" in state:
+                self.url_filter.load(state["url_filter"])
+        return True
+
+def expand_links(near_duplicates, url, page):
+    # Pages are always recorded; only following their links can be cut short
+    if near_duplicates is None:
+        return True
+    near_duplicates.add(url, page.get("simhash"))
+    if near_duplicates.should_expand(url):
+        return True
+    print(f"Not following links from {url}: its URL pattern keeps producing near-duplicate pages")
+    return False
+
+def crawl_worker(driver, frontier, artifacts, manifest=None, wait_strategy=None, scheduler=None):
+    scheduler = scheduler or HostScheduler()
+    while True:
+        item = frontier.next()
+        if item is None:
+            return
+        url, _ = item
+        page = None
+        try:
+            if not scheduler.allowed(url):
+                print(f"Skipping {url}: disallowed by robots.txt")
+                continue
+            scheduler.acquire(url)
+            try:
+                page = crawl_page(driver, url, artifacts, manifest, wait_strategy)
+            finally:
+                status, latency = None, None
+                if page:
+                    status = page.get("http_status_code") or 200
+                    timings = page.get("timings_ms", {})
+                    latency = timings.get("navigate", timings.get("revalidate", 0)) / 1000
+                scheduler.release(url, status, latency)
+        except Exception as e:
             print(f"Failed to crawl {url}: {e}")
-        return {}
-    
-    site_map = {
-        url: {
-            "page_load_time_ms": load_time,
-            "http_status_code": http_status_code,
-            "content_size_mb": content_size,
-            "screenshot_path": screenshot_path,
-            "text_file_path": text_file_path,
-            "full_width": full_width,
-            "full_height": full_height,
-            "links": links
-        }
-    }
+        finally:
+            frontier.complete(url, page)
 
-    for link in links:
-        if link not in visited:
-            # Pass the exclude_translations parameter to recursive calls
-            site_map.update(crawl_site(driver, link, screenshot_dir, text_dir, base_domain, max_depth, current_depth + 1, visited, exclude_translations))
+def crawl_site(drivers, frontier, artifacts, manifest=None, wait_strategy=None, scheduler=None):
+    # One worker per driver; all of them pull from the same frontier and
+    # share its visited set, so no page is rendered twice.
+    if len(drivers) == 1:
+        crawl_worker(drivers[0], frontier, artifacts, manifest, wait_strategy, scheduler)
+    else:
+        threads = [threading.Thread(target=crawl_worker, args=(driver, frontier, artifacts, manifest, wait_strategy, scheduler), daemon=True) for driver in drivers]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
 
-    return site_map
+    if frontier.state_path:
+        frontier.checkpoint()
+    if manifest:
+        manifest.save()
+    return frontier.site_map
 
 def is_arm_mac():
     if platform.system() != "Darwin":
@@ -255,7 +967,37 @@ def is_arm_mac():
     except:
         return False
     
-def get_driver(screen_width):
+RESOURCE_POLICIES = ('full', 'text-only', 'no-third-party')
+
+# URL patterns for Network.setBlockedURLs under the text-only policy. Each
+# extension must end the path, with or without a query string ("logo.png?v=3"),
+# so hosts such as www.webmd.com or www.gifts.com are not caught.
+TEXT_ONLY_BLOCKED_URLS = [
+    pattern for extension in (
+        'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif', 'svg', 'ico', 'bmp',
+        'mp4', 'webm', 'ogg', 'ogv', 'mp3', 'wav', 'm4a', 'mov', 'm3u8',
+        'woff', 'woff2', 'ttf', 'otf', 'eot'
+    ) for pattern in (f"*.{extension}", f"*.{extension}?*")
+] + ["*/_next/image*"]
+
+@functools.lru_cache(maxsize=None)
+def get_chromedriver_path(chrome_type=None):
+    # install() looks up the latest chromedriver online on every call, so it
+    # is done once per process instead of once per browser
+    if chrome_type is None:
+        return ChromeDriverManager().install()
+    return ChromeDriverManager(chrome_type=chrome_type).install()
+
+def resolver_site(resource_policy, base_domain):
+    """The site whose hosts still resolve under the no-third-party policy; None when no host is blocked."""
+    if resource_policy == 'no-third-party' and base_domain:
+        return urlparse(f"//{base_domain}").hostname.removeprefix('www.')
+    return None
+
+def is_third_party(host, site):
+    return not (host == site or host.endswith('.' + site))
+
+def get_driver(screen_width, resource_policy='full', base_domain=None):
     options = Options()
     options.headless = True
     options.add_argument("--headless")
@@ -263,136 +1005,383 @@ def get_driver(screen_width):
     options.add_argument('--no-sandbox')
     options.add_argument('--disable-dev-shm-usage')
     options.add_argument(f'--window-size={screen_width},1080')
+    # driver.get() returns at DOMContentLoaded; WaitStrategy decides how much longer to wait
+    options.page_load_strategy = 'eager'
+
+    options.add_argument(f'user-agent={USER_AGENT}')
 
-    options.add_argument('user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3')
+    # Record Network.* CDP events so status and size come from the page load itself
+    options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    site = resolver_site(resource_policy, base_domain)
+    if site:
+        # Every host outside the site fails to resolve, so third-party
+        # scripts, ads and analytics never load
+        options.add_argument(f'--host-resolver-rules=MAP * ~NOTFOUND , EXCLUDE {site} , EXCLUDE *.{site}')
 
     if not is_arm_mac():
-        service = Service(ChromeDriverManager().install())
+        service = Service(get_chromedriver_path())
         driver = webdriver.Chrome(service=service, options=options)
-        return driver
+    else:
+        #Use ChromeType.CHROMIUM for ARM64 Macs
+        driver_path = get_chromedriver_path(ChromeType.CHROMIUM)
+        service = Service(driver_path)
+        try:
+            driver = webdriver.Chrome(service=service, options=options)
+        except Exception as e:
+            print(f"Error initializing Chrome driver: {e}")
+            print("Attempting to use Selenium Manager...")
+            options.add_argument("--use-selenium-manager")
+            driver = webdriver.Chrome(options=options)
+
+    # Needed for Network.getResponseBody and Network.setBlockedURLs
+    driver.execute_cdp_cmd("Network.enable", {})
+    if resource_policy == 'text-only':
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": TEXT_ONLY_BLOCKED_URLS})
+    return driver
 
-    #Use ChromeType.CHROMIUM for ARM64 Macs
-    driver_path = ChromeDriverManager(chrome_type=ChromeType.CHROMIUM).install()
-    service = Service(driver_path)
+def get_process_tree_rss(pid):
+    # Chrome runs as many processes under chromedriver; their memory adds up
+    import psutil
     try:
-        driver = webdriver.Chrome(service=service, options=options)
-    except Exception as e:
-        print(f"Error initializing Chrome driver: {e}")
-        print("Attempting to use Selenium Manager...")
-        options.add_argument("--use-selenium-manager")
-        driver = webdriver.Chrome(options=options)
+        root = psutil.Process(pid)
+        processes = [root] + root.children(recursive=True)
+    except psutil.Error:
+        return 0
+    rss = 0
+    for process in processes:
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            # Exited while we were looking
+            pass
+    return rss
 
-    return driver
+class ManagedDriver:
+    """
+    Headless Chrome that is replaced before it slows a long crawl down.
+
+    Chrome's memory, and with it the time per page, grows with every page
+    it renders, so get() hands out a fresh browser after `recycle_after`
+    pages, or sooner once Chrome's processes use more than `max_rss_mb`
+    (measured with psutil). recover() restarts a browser that stopped
+    answering so the page it failed on can be retried.
+    """
+
+    def __init__(self, screen_width, resource_policy='full', base_domain=None, recycle_after=500, max_rss_mb=None):
+        self.screen_width = screen_width
+        self.resource_policy = resource_policy
+        self.base_domain = base_domain
+        self.resolver_site = resolver_site(resource_policy, base_domain)
+        self.recycle_after = recycle_after
+        self.max_rss_mb = max_rss_mb
+        self.driver = None
+        self.pages = 0
+        self.restarts = 0
+
+    def get(self):
+        """The browser for the next page, started or replaced as needed."""
+        if self.driver is not None:
+            if self.recycle_after and self.pages >= self.recycle_after:
+                self.restart(f"recycling after {self.pages} pages")
+            elif self.max_rss_mb and self.rss_mb() > self.max_rss_mb:
+                self.restart(f"using {self.rss_mb():.0f} MB, over {self.max_rss_mb} MB")
+        if self.driver is None:
+            self.start()
+        self.pages += 1
+        return self.driver
+
+    def start(self):
+        self.driver = get_driver(self.screen_width, self.resource_policy, self.base_domain)
+        self.pages = 0
+
+    def rss_mb(self):
+        return get_process_tree_rss(self.driver.service.process.pid) / (1024 * 1024)
+
+    def is_alive(self):
+        try:
+            self.driver.execute_script("return 1")
+            return True
+        except WebDriverException:
+            return False
+
+    def recover(self):
+        """Restart the browser if it no longer responds; True if it was restarted."""
+        if self.driver is not None and self.is_alive():
+            return False
+        self.restart("browser stopped responding")
+        return True
+
+    def restart(self, reason):
+        print(f"Restarting Chrome: {reason}")
+        self.quit()
+        self.restarts += 1
+
+    def quit(self):
+        if self.driver is not None:
+            try:
+                self.driver.quit()
+            except Exception:
+                # A crashed browser may already be gone
+                pass
+            self.driver = None
+
+def get_crawl_state_path(base_dir):
+    return os.path.join(base_dir, 'crawl_state.json')
+
+def get_manifest_path(base_dir):
+    return os.path.join(base_dir, 'manifest.sqlite')
+
+def get_visited_db_path(base_dir):
+    return os.path.join(base_dir, 'visited.sqlite')
+
+def get_page_log_path(base_dir):
+    return os.path.join(base_dir, 'pages.jsonl')
+
+def create_page_loaders(engine, count, screen_width, js_fallback=False, resource_policy='full', base_domain=None, recycle_after=500, max_rss_mb=None):
+    # Every headless Chrome costs a few hundred MB, so the pool size is up to the caller
+    count = max(count, 1)
+    if engine == 'http':
+        http_session = create_http_session(count)
+        return [HttpEngine(http_session, screen_width, js_fallback, resource_policy, base_domain, recycle_after, max_rss_mb) for _ in range(count)]
 
-def create_sitemap(url, max_depth=2, screen_width="1366", exclude_translations=False):
-    driver = get_driver(screen_width)
+    drivers = []
+    try:
+        for _ in range(count):
+            drivers.append(ManagedDriver(screen_width, resource_policy, base_domain, recycle_after, max_rss_mb))
+            # Started now so a broken Chrome setup fails before the crawl begins
+            drivers[-1].start()
+    except Exception:
+        for driver in drivers:
+            driver.quit()
+        raise
+    return drivers
+
+def create_artifact_writer(base_dir, widths, screenshot_format='png', screenshot_quality=80, thumbnail_width=None):
+    # Text is extracted once, at the first width
+    screenshot_dirs = {width: os.path.join(base_dir, f"screens_{width}") for width in widths}
+    return ArtifactWriter(screenshot_dirs, os.path.join(base_dir, f"texts_{widths[0]}"), screenshot_format, screenshot_quality, thumbnail_width)
+
+def parse_widths(value):
+    widths = [width.strip() for width in value.split(',') if width.strip()]
+    if not widths or not all(width.isdigit() and int(width) > 0 for width in widths):
+        raise argparse.ArgumentTypeError(f"expected comma-separated screen widths, got {value!r}")
+    return list(dict.fromkeys(widths))
 
-    parsed_url = urlparse(url)
-    base_domain = parsed_url.netloc
+def create_scheduler(workers, rate=None, respect_robots=True):
+    # Workers never wait on each other unless the host asks for it or starts struggling
+    robots = RobotsCache(USER_AGENT, session) if respect_robots else None
+    return HostScheduler(rate, max_per_host=max(workers, 1), robots=robots)
+
+def create_sitemap(url, max_depth=2, screen_width="1366", exclude_translations=False, workers=1, resume=False, checkpoint_every=50, engine='chrome', js_fallback=False, incremental=False, wait_strategy=None, resource_policy='full', screenshot_format='png', screenshot_quality=80, thumbnail_width=None, widths=None, scheduler=None, canonicalizer=None, visited_set='exact', visited_capacity=10_000_000, page_log=None, frontier=None, drivers=None, recycle_after=500, max_rss_mb=None, near_duplicates=None, url_filter=None):
+    # A frontier passed in, e.g. a SharedFrontier, is already seeded and stays
+    # open; so do drivers passed in, to be reused for the next crawl
+    widths = widths or [screen_width]
+    screen_width = widths[0]
+    # As canonical links spell it, or the seed itself is rejected as off-site
+    base_domain = canonical_host(url)
     base_dir = os.path.join("scrape", f"{base_domain.replace('.', '_')}")
-    screenshot_dir = os.path.join(base_dir, f"screens_{screen_width}")
-    text_dir = os.path.join(base_dir, f"texts_{screen_width}")
-    os.makedirs(screenshot_dir, exist_ok=True)
-    os.makedirs(text_dir, exist_ok=True)
+    os.makedirs(base_dir, exist_ok=True)
 
+    own_frontier = frontier is None
+    if own_frontier:
+        visited = create_visited_set(visited_set, get_visited_db_path(base_dir), visited_capacity, keep_existing=resume)
+        frontier = CrawlFrontier(base_domain, max_depth, exclude_translations, get_crawl_state_path(base_dir), checkpoint_every, canonicalize=canonicalizer, visited=visited, page_log=page_log, near_duplicates=near_duplicates, url_filter=url_filter)
+        if resume and frontier.load():
+            print(f"Resuming crawl: {frontier.pages_done} pages done, {len(frontier.queue)} queued")
+        else:
+            frontier.admit(url, 0)
+
+    manifest = CrawlManifest(get_manifest_path(base_dir), incremental)
+    own_drivers = drivers is None
+    if own_drivers:
+        drivers = create_page_loaders(engine, workers, screen_width, js_fallback, resource_policy, base_domain, recycle_after, max_rss_mb)
+    artifacts = create_artifact_writer(base_dir, widths, screenshot_format, screenshot_quality, thumbnail_width)
     try:
-        site_map = crawl_site(driver, url, screenshot_dir, text_dir, base_domain, max_depth, exclude_translations=exclude_translations)
+        site_map = crawl_site(drivers, frontier, artifacts, manifest, wait_strategy, scheduler or create_scheduler(workers))
     finally:
-        driver.quit()
+        artifacts.close()
+        manifest.close()
+        if own_frontier:
+            frontier.visited.close()
+        if own_drivers:
+            for driver in drivers:
+                driver.quit()
 
     return site_map
 
-def load_additional_pages_from_sitemap(driver, base_url, site_map, visited, screenshot_dir, text_dir, base_domain, exclude_translations):
-    sitemap_url = os.path.join(base_url, 'sitemap.xml')
-    response = session.get(sitemap_url)  # Use the session with the cookie
-    if response.status_code == 200:
-        root = ET.fromstring(response.content)
-        for url_element in root.findall(".//{http://www.sitemaps.org/schemas/sitemap/0.9}url/{http://www.sitemaps.org/schemas/sitemap/0.9}loc"):
-            url = url_element.text
-            parsed_url = urlparse(url)
-            if url not in visited and (not exclude_translations or not is_translated_url(parsed_url.path)):
-                site_map.update(crawl_site(driver, url, screenshot_dir, text_dir, base_domain, max_depth=1, visited=visited, exclude_translations=exclude_translations))
-
-def is_translated_url(path):
-    # This function checks if the URL path indicates a translated page
-    # You can customize this based on your site's URL structure
-    language_codes = [
-        'fr', 'es', 'de', 'it', 'ja', 'ko', 'zh',
-        'sg', 'id', 'th', 'vi', 'ms', 'ar', 'hi', 
-        'bn', 'ur', 'fa', 'tr', 'nl', 'pl', 'cs', 
-        'sk', 'hu', 'ro', 'bg', 'sr', 'hr', 'sl', 
-        'mk', 'bg', 'sr', 'hr', 'sl', 'mk', 'en-nl',
-        'pl', 'nl-nl', 'en-es', 'id-id', 'nl-nl',
-        'fr-fr', 'en-fr', 'en-ca', 'en-gb', 'en-au', 
-        'en-nz', 'en-sg', 'en-hk', 'en-in', 'en-ph', 
-        'en-id', 'en-my', 'en-th', 'en-tw', 'en-kr', 
-        'en-jp', 'en-cn', 'en-tr', 'en-ae', 'en-sa', 
-        'en-eg', 'en-il', 'en-ng', 'en-za', 'en-ke', 
-        'en-ug', 'en-zm', 'en-zw', 'en-gh', 'en-ng', 
-        'en-za', 'en-ke', 'en-ug', 'en-zm', 'en-zw', 
-        'en-gh'
-    ]
-    parts = path.split('/')
-    return any(part in language_codes for part in parts)
+def load_additional_pages_from_sitemap(drivers, base_url, frontier, artifacts, manifest=None, wait_strategy=None, scheduler=None):
+    sitemap_urls = find_sitemap_urls(base_url, session)  # Use the session with the cookie
+    # Sitemap pages are crawled together with the pages they link to
+    depth = max(frontier.max_depth - 1, 0)
+    frontier.add_source(iter_sitemap_urls(sitemap_urls, session), depth)
+    crawl_site(drivers, frontier, artifacts, manifest, wait_strategy, scheduler)
+
+def seed_shared_frontier(frontier, url, resume=False):
+    # The coordinator starts (or resumes) the crawl; the sitemap's pages are
+    # fed in while the workers are already crawling
+    if resume and frontier.join(coordinator=True):
+        print(f"Resuming shared crawl: {frontier.pages_done} pages done, {len(frontier.queue)} queued")
+    else:
+        frontier.reset(url)
+    sitemap_urls = find_sitemap_urls(url, session)
+    frontier.add_source(iter_sitemap_urls(sitemap_urls, session), max(frontier.max_depth - 1, 0))
+
+def write_crawl_outputs(base_dir, page_log_path, website_url, canonicalizer=None, near_duplicate_distance=3):
+    page_count = compact_page_log(page_log_path, base_dir, website_url, canonicalizer, near_duplicate_distance)
+    print(f"{page_count} pages written to {os.path.join(base_dir, 'sitemap.json')}, with sitemap.xml and backlinks.json alongside")
+
+    timing_report = summarize_timings(page for _, page in iter_pages(page_log_path))
+    with open(os.path.join(base_dir, 'timing_report.json'), 'w') as f:
+        json.dump(timing_report, f, indent=4)
+    print_timing_report(timing_report)
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python script.py <URL> [screen_width] [exclude_translations]")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Crawl a website and generate a sitemap with screenshots and page text.")
+    parser.add_argument('url', type=str, help="The website URL to crawl.")
+    parser.add_argument('screen_width', type=str, nargs='?', default="1366", help="Browser window width (default: 1366).")
+    parser.add_argument('exclude_translations', type=str, nargs='?', default="false", help="Pass 'true' to skip translated pages (default: false).")
+    parser.add_argument('--widths', type=parse_widths, help="Comma-separated screen widths, e.g. 1920,768,375. Pages are crawled once at the first width and re-captured at the others; overrides screen_width.")
+    parser.add_argument('--workers', type=int, default=1, help="Number of headless Chrome drivers crawling in parallel (default: 1).")
+    parser.add_argument('--engine', choices=['chrome', 'http'], default='chrome', help="Render pages in Chrome, or fetch them over plain HTTP without screenshots (default: chrome).")
+    parser.add_argument('--js-fallback', action='store_true', help="With --engine http, render pages that look JavaScript-driven (empty <main>, SPA root) in Chrome.")
+    parser.add_argument('--incremental', action='store_true', help="Skip rendering pages that are unchanged since the last crawl, reusing their previous entries.")
+    parser.add_argument('--wait', choices=WAIT_STRATEGIES, default='network-idle', help="When a page counts as loaded (default: network-idle).")
+    parser.add_argument('--idle-ms', type=int, default=500, help="Quiet window for --wait network-idle, in milliseconds (default: 500).")
+    parser.add_argument('--idle-connections', type=int, default=0, help="Requests allowed to stay open during the quiet window, e.g. for long polling (default: 0).")
+    parser.add_argument('--wait-selector', type=str, help="CSS selector for --wait selector.")
+    parser.add_argument('--wait-timeout', type=float, default=30, help="Longest wait per page, in seconds (default: 30).")
+    parser.add_argument('--resource-policy', choices=RESOURCE_POLICIES, default='full', help="Resources Chrome may load: everything, no images/media/fonts (text-only), or only the site's own hosts (default: full).")
+    parser.add_argument('--screenshot-format', choices=list(SCREENSHOT_FORMATS), default='png', help="Format screenshots are stored in; webp and jpeg need Pillow (default: png).")
+    parser.add_argument('--screenshot-quality', type=int, default=80, help="Quality for webp and jpeg screenshots, 1-100 (default: 80).")
+    parser.add_argument('--thumbnail-width', type=int, help="Also store a thumbnail of each screenshot scaled down to this width.")
+    parser.add_argument('--rate', type=float, help="Most requests per second sent to the site; a robots.txt Crawl-delay takes precedence (default: no fixed rate).")
+    parser.add_argument('--ignore-robots', action='store_true', help="Crawl pages robots.txt disallows and ignore its Crawl-delay.")
+    parser.add_argument('--no-canonicalize', action='store_true', help="Treat every distinct link as its own page, instead of dropping #fragments, tracking parameters and default ports and sorting query parameters.")
+    parser.add_argument('--drop-params', type=str, default='', help="Comma-separated query parameters to drop from URLs as well, e.g. sessionid,sort.")
+    parser.add_argument('--drop-query', action='store_true', help="Drop the whole query string from URLs.")
+    parser.add_argument('--trailing-slash', choices=TRAILING_SLASH_RULES, default='keep', help="Strip or add the final slash of URL paths (default: keep).")
+    parser.add_argument('--lowercase-paths', action='store_true', help="Treat URL paths case-insensitively.")
+    parser.add_argument('--visited-set', choices=VISITED_SET_KINDS, default='exact', help="How visited URLs are remembered: as strings, as 64-bit hashes, or in a Bloom filter backed by SQLite for million-page crawls (default: exact).")
+    parser.add_argument('--visited-capacity', type=int, default=10_000_000, help="URLs the Bloom filter is sized for (default: 10000000).")
+    parser.add_argument('--near-duplicate-distance', type=int, default=3, help="Pages whose 64-bit text SimHashes differ in at most this many bits are near-duplicates (default: 3).")
+    parser.add_argument('--near-duplicate-limit', type=int, help="Stop following links from a URL pattern (numbers and query values ignored) once it has produced this many near-duplicate pages.")
+    add_filter_arguments(parser)
+    parser.add_argument('--recycle-after', type=int, default=500, help="Replace each Chrome after it has rendered this many pages, 0 for never (default: 500).")
+    parser.add_argument('--max-driver-rss', type=int, metavar='MB', help="Also replace a Chrome once its processes use more than MB of memory; needs psutil.")
+    parser.add_argument('--profile', type=str, metavar='PATH', help="Write a cProfile dump of the crawl to PATH (read it with pstats or snakeviz). Only the main thread is profiled, so use it with --workers 1.")
+    parser.add_argument('--shared-store', type=str, metavar='PATH', help="Crawl together with other processes through a SQLite database at PATH, e.g. on a shared volume; see --role.")
+    parser.add_argument('--role', choices=['coordinator', 'worker'], default='coordinator', help="With --shared-store: the coordinator starts the crawl, crawls alongside the workers and writes the outputs; workers only crawl (default: coordinator).")
+    parser.add_argument('--worker-id', type=str, help="Name this process leases URLs under (default: hostname-pid).")
+    parser.add_argument('--lease-seconds', type=float, default=300, help="How long a worker may hold a URL before it is handed to another worker (default: 300).")
+    parser.add_argument('--resume', action='store_true', help="Continue an interrupted crawl from its last checkpoint.")
+    parser.add_argument('--checkpoint-every', type=int, default=50, help="Write crawl state to disk every N pages (default: 50).")
+    args = parser.parse_args()
+    if args.wait == 'selector' and not args.wait_selector:
+        parser.error("--wait selector requires --wait-selector")
+    if args.screenshot_format != 'png' or args.thumbnail_width:
+        try:
+            import PIL
+        except ImportError:
+            parser.error("--screenshot-format webp/jpeg and --thumbnail-width require Pillow (pip install Pillow)")
+    if args.max_driver_rss:
+        try:
+            import psutil
+        except ImportError:
+            parser.error("--max-driver-rss requires psutil (pip install psutil)")
+    wait_strategy = WaitStrategy(args.wait, args.idle_ms, args.wait_selector, args.wait_timeout, args.idle_connections)
 
-    website_url = sys.argv[1]
-    screen_width = sys.argv[2] if len(sys.argv) > 2 else "1366"
-    exclude_translations = sys.argv[3].lower() == 'true' if len(sys.argv) > 3 else False
+    website_url = args.url
+    widths = args.widths or [args.screen_width]
+    screen_width = widths[0]
+    exclude_translations = args.exclude_translations.lower() == 'true'
     if exclude_translations:
         print("Excluding translated pages")
 
-    sitemap = create_sitemap(website_url, screen_width=screen_width, exclude_translations=exclude_translations)
-    base_dir = f"{urlparse(website_url).netloc.replace('.', '_')}"
+    base_domain = canonical_host(website_url)
+    url_filter = filter_from_args(args, base_domain, exclude_translations)
+    scheduler = create_scheduler(args.workers, args.rate, not args.ignore_robots)
+    canonicalizer = None
+    if not args.no_canonicalize:
+        drop_params = [name.strip() for name in args.drop_params.split(',') if name.strip()]
+        canonicalizer = UrlCanonicalizer(drop_params, args.drop_query, args.trailing_slash, args.lowercase_paths)
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler:
+        profiler.enable()
+
+    base_dir = f"{base_domain.replace('.', '_')}"
     base_dir = os.path.join("scrape", base_dir)
     
     # Create the base directory if it doesn't exist
     os.makedirs(base_dir, exist_ok=True)
-    
-    sitemap_path = os.path.join(base_dir, 'sitemap.json')
-    with open(sitemap_path, 'w') as f:
-        json.dump(sitemap, f, indent=4)
 
-    print(json.dumps(sitemap, indent=4))
+    page_log_path = get_page_log_path(base_dir)
+    crawl_options = dict(screen_width=screen_width, exclude_translations=exclude_translations, workers=args.workers, engine=args.engine, js_fallback=args.js_fallback, incremental=args.incremental, wait_strategy=wait_strategy, resource_policy=args.resource_policy, screenshot_format=args.screenshot_format, screenshot_quality=args.screenshot_quality, thumbnail_width=args.thumbnail_width, widths=widths, scheduler=scheduler, canonicalizer=canonicalizer, url_filter=url_filter)
 
-    driver = get_driver(screen_width)
+    near_duplicates = None
+    if args.near_duplicate_limit:
+        near_duplicates = NearDuplicateIndex(args.near_duplicate_distance, args.near_duplicate_limit)
+        if args.resume and not args.shared_store and os.path.exists(page_log_path):
+            # Pages crawled before the interruption count towards the limits
+            for url, page in iter_pages(page_log_path):
+                near_duplicates.add(url, page.get("simhash"))
 
+    # One warm pool of browsers serves the link crawl and the sitemap pass
+    drivers = create_page_loaders(args.engine, args.workers, screen_width, args.js_fallback, args.resource_policy, base_domain, args.recycle_after, args.max_driver_rss)
     try:
-        visited = set(sitemap.keys())
-        parsed_url = urlparse(website_url)
-        base_domain = parsed_url.netloc
-        load_additional_pages_from_sitemap(driver, website_url, sitemap, visited, os.path.join(base_dir, f"screens_{screen_width}"), os.path.join(base_dir, f"texts_{screen_width}"), base_domain, exclude_translations)
+        if args.shared_store:
+            frontier = SharedFrontier(args.shared_store, should_crawl=url_filter.allow, canonicalize=canonicalizer, worker_id=args.worker_id, lease_seconds=args.lease_seconds, expand_links=functools.partial(expand_links, near_duplicates) if near_duplicates else None)
+            try:
+                if args.role == 'coordinator':
+                    seed_shared_frontier(frontier, website_url, args.resume)
+                elif not frontier.join():
+                    parser.error(f"no crawl in {args.shared_store}; start the coordinator first")
+                create_sitemap(website_url, frontier=frontier, drivers=drivers, **crawl_options)
+                if args.role == 'coordinator':
+                    # Every worker reports into the store, so it holds the whole crawl
+                    frontier.export_page_log(page_log_path)
+            finally:
+                frontier.close()
+            if args.role == 'worker':
+                print(f"Crawl finished; the coordinator writes the site map from {args.shared_store}")
+        else:
+            # Pages are appended here as they finish; sitemap.json is built from it at the end
+            page_log = PageLog(page_log_path, append=args.resume)
+            try:
+                create_sitemap(website_url, resume=args.resume, checkpoint_every=args.checkpoint_every, visited_set=args.visited_set, visited_capacity=args.visited_capacity, page_log=page_log, drivers=drivers, near_duplicates=near_duplicates, **crawl_options)
+
+                artifacts = create_artifact_writer(base_dir, widths, args.screenshot_format, args.screenshot_quality, args.thumbnail_width)
+
+                try:
+                    visited = create_visited_set(args.visited_set, get_visited_db_path(base_dir), args.visited_capacity, keep_existing=True)
+                    frontier = CrawlFrontier(base_domain, exclude_translations=exclude_translations, state_path=get_crawl_state_path(base_dir), checkpoint_every=args.checkpoint_every, canonicalize=canonicalizer, visited=visited, page_log=page_log, near_duplicates=near_duplicates, url_filter=url_filter)
+                    frontier.load()
+                    manifest = CrawlManifest(get_manifest_path(base_dir), args.incremental)
+                    try:
+                        load_additional_pages_from_sitemap(drivers, website_url, frontier, artifacts, manifest, wait_strategy, scheduler)
+                    finally:
+                        manifest.close()
+                finally:
+                    artifacts.close()
+            finally:
+                page_log.close()
+
+            # The crawl finished, so there is nothing left to resume
+            os.remove(get_crawl_state_path(base_dir))
+            frontier.visited.close()
+            if os.path.exists(get_visited_db_path(base_dir)):
+                os.remove(get_visited_db_path(base_dir))
     finally:
-        driver.quit()
-
-    with open(sitemap_path, 'w') as f:
-        json.dump(sitemap, f, indent=4)
-
-    file_checksums = {}
-    for root, dirs, files in os.walk(base_dir):
-        for file in files:
-            if file.endswith('.md'):
-                file_path = os.path.join(root, file)
-                with open(file_path, 'rb') as f:
-                    file_content = f.read()
-                    file_checksum = hashlib.md5(file_content).hexdigest()
-
-                    if file_checksum in file_checksums:
-                        # If this checksum already exists, compare file names
-                        existing_file = file_checksums[file_checksum]
-                        if len(file) < len(existing_file):
-                            # Current file has a shorter name, delete the existing one
-                            os.remove(os.path.join(root, existing_file))
-                            file_checksums[file_checksum] = file
-                        else:
-                            # Existing file has a shorter or equal length name, delete the current one
-                            os.remove(file_path)
-                    else:
-                        # New checksum, add to dictionary
-                        file_checksums[file_checksum] = file
-
-    print(json.dumps(sitemap, indent=4))
+        for driver in drivers:
+            driver.quit()
+
+    # With a shared store, each process reports the links it filtered itself
+    print(url_filter.summary())
+    if not args.shared_store or args.role == 'coordinator':
+        write_crawl_outputs(base_dir, page_log_path, website_url, canonicalizer, args.near_duplicate_distance)
+
+    if profiler:
+        profiler.disable()
+        profiler.dump_stats(args.profile)
+        print(f"Profile written to {args.profile}")
@@ -0,0 +1,241 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+import requests
+
+# Answers that mean the host wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+
+# A response this many times slower than the fastest seen from a host counts as congestion
+SLOW_RESPONSE_FACTOR = 4
+
+# ...but only once it is slower than this many seconds in absolute terms
+SLOW_RESPONSE_FLOOR = 1.0
+
+class RobotsCache:
+    """robots.txt rules per origin, fetched on first use and kept for the rest of the run."""
+
+    def __init__(self, user_agent, http_session=None, timeout=10):
+        self.user_agent = user_agent
+        self.session = http_session or requests.Session()
+        self.timeout = timeout
+        self.parsers = {}
+        self.fetch_locks = {}
+        self.lock = threading.Lock()
+
+    def get_parser(self, url):
+        parts = urlsplit(url)
+        origin = f"{parts.scheme}://{parts.netloc}"
+        with self.lock:
+            if origin in self.parsers:
+                return self.parsers[origin]
+            fetch_lock = self.fetch_locks.setdefault(origin, threading.Lock())
+        # Only one thread fetches each robots.txt; the others wait for its result
+        with fetch_lock:
+            with self.lock:
+                if origin in self.parsers:
+                    return self.parsers[origin]
+            parser = self.fetch(origin)
+            with self.lock:
+                self.parsers[origin] = parser
+            return parser
+
+    def fetch(self, origin):
+        parser = RobotFileParser(f"{origin}/robots.txt")
+        try:
+            response = self.session.get(f"{origin}/robots.txt", timeout=self.timeout)
+        except requests.RequestException as e:
+            print(f"Failed to fetch robots.txt for {origin}: {e}")
+            parser.allow_all = True
+            return parser
+        # Same rules as RobotFileParser.read()
+        if response.status_code in (401, 403):
+            parser.disallow_all = True
+        elif response.status_code >= 400:
+            parser.allow_all = True
+        else:
+            parser.parse(response.text.splitlines())
+        return parser
+
+    def allowed(self, url):
+        return self.get_parser(url).can_fetch(self.user_agent, url)
+
+    def crawl_delay(self, url):
+        """Seconds to leave between requests, from Crawl-delay or Request-rate; None if unset."""
+        parser = self.get_parser(url)
+        delay = parser.crawl_delay(self.user_agent)
+        if delay is not None:
+            return float(delay)
+        request_rate = parser.request_rate(self.user_agent)
+        if request_rate is not None and request_rate.requests:
+            return request_rate.seconds / request_rate.requests
+        return None
+
+class HostThrottle:
+    """
+    Token bucket plus AIMD concurrency window for one host.
+    The window grows by one request per window's worth of good answers and
+    halves, at most once per round trip, on 429/503, errors, Retry-After or
+    responses much slower than the host's best. Not thread-safe on its own;
+    HostScheduler holds its lock around every call.
+    """
+
+    def __init__(self, rate=None, burst=1, max_concurrency=8, min_concurrency=1):
+        self.rate = rate
+        self.capacity = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = float(max_concurrency)
+        self.in_flight = 0
+        self.paused_until = 0
+        self.fastest = None
+        self.last_decrease = 0
+        # (loop, future) of async tasks waiting for a free slot, oldest first
+        self.waiters = deque()
+
+    def free_slots(self):
+        return int(self.limit) - self.in_flight
+
+    def try_acquire(self, now):
+        """Take a slot and return 0, or return seconds to wait (None: until a request finishes)."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.limit):
+            return None
+        if self.rate:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return (1 - self.tokens) / self.rate
+            self.tokens -= 1
+        self.in_flight += 1
+        return 0
+
+    def release(self, now, status=None, latency=None, retry_after=None):
+        self.in_flight -= 1
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+
+        if latency is not None:
+            self.fastest = latency if self.fastest is None else min(self.fastest, latency)
+        slow = latency is not None and latency > max(SLOW_RESPONSE_FACTOR * self.fastest, SLOW_RESPONSE_FLOOR)
+
+        if status is None or status in THROTTLE_STATUSES or slow:
+            # Answers to requests sent before the last decrease say nothing new
+            if now - self.last_decrease > (latency or 0):
+                self.limit = max(self.min_concurrency, self.limit / 2)
+                self.last_decrease = now
+        else:
+            self.limit = min(self.max_concurrency, self.limit + 1 / self.limit)
+
+class HostScheduler:
+    """
+    Decides when a request to a host may go out, shared by every worker of a tool.
+    Each host gets a HostThrottle; its rate comes from robots.txt Crawl-delay
+    when there is one, otherwise from `rate` (None: no fixed rate, only the
+    adaptive window). Call acquire() or acquire_async() before a request and
+    release() with the outcome after it. Async tasks waiting on a full
+    window sleep until a release wakes them, one per freed slot, in the
+    order they started waiting.
+    """
+
+    def __init__(self, rate=None, burst=1, max_per_host=8, min_per_host=1, robots=None):
+        self.rate = rate
+        self.burst = burst
+        self.max_per_host = max_per_host
+        self.min_per_host = min_per_host
+        self.robots = robots
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.released = threading.Condition(self.lock)
+
+    def set_host_limits(self, url, rate, burst=1, max_concurrency=None):
+        """Fix the rate for one host, e.g. an API with a published request limit."""
+        throttle = HostThrottle(rate, burst, max_concurrency or self.max_per_host, self.min_per_host)
+        with self.lock:
+            self.hosts[urlsplit(url).netloc] = throttle
+        return throttle
+
+    def get_throttle(self, url):
+        host = urlsplit(url).netloc
+        with self.lock:
+            throttle = self.hosts.get(host)
+        if throttle is not None:
+            return throttle
+
+        rate, burst = self.rate, self.burst
+        # Fetching robots.txt can take a while, so it happens outside the lock
+        delay = self.robots.crawl_delay(url) if self.robots else None
+        if delay:
+            rate, burst = 1 / delay, 1
+        with self.lock:
+            return self.hosts.setdefault(host, HostThrottle(rate, burst, self.max_per_host, self.min_per_host))
+
+    def allowed(self, url):
+        return self.robots is None or self.robots.allowed(url)
+
+    def acquire(self, url):
+        throttle = self.get_throttle(url)
+        with self.released:
+            while True:
+                wait = throttle.try_acquire(time.monotonic())
+                if wait == 0:
+                    return
+                self.released.wait(wait)
+
+    def release(self, url, status=None, latency=None, retry_after=None):
+        """Report how a request went: its HTTP status (None on error or timeout) and latency in seconds."""
+        throttle = self.get_throttle(url)
+        with self.released:
+            throttle.release(time.monotonic(), status, latency, retry_after)
+            self.wake_waiters(throttle, throttle.free_slots())
+            self.released.notify_all()
+
+    def wake_waiters(self, throttle, count):
+        # Called with the lock held; the futures belong to their tasks' loops
+        while count > 0 and throttle.waiters:
+            loop, waiter = throttle.waiters.popleft()
+            loop.call_soon_threadsafe(wake_waiter, waiter)
+            count -= 1
+
+    async def allowed_async(self, url):
+        if self.robots is None:
+            return True
+        return await asyncio.to_thread(self.robots.allowed, url)
+
+    async def acquire_async(self, url):
+        if self.robots is None:
+            throttle = self.get_throttle(url)
+        else:
+            throttle = await asyncio.to_thread(self.get_throttle, url)
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.lock:
+                wait = throttle.try_acquire(time.monotonic())
+                if wait is None:
+                    waiter = loop.create_future()
+                    throttle.waiters.append((loop, waiter))
+            if wait == 0:
+                return
+            if wait is not None:
+                await asyncio.sleep(wait)
+                continue
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                with self.lock:
+                    if (loop, waiter) in throttle.waiters:
+                        throttle.waiters.remove((loop, waiter))
+                    else:
+                        # Woken just before being cancelled: pass the slot on
+                        self.wake_waiters(throttle, 1)
+                raise
+
+def wake_waiter(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
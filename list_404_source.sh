@@ -6,16 +6,15 @@ else
     exit 1
 fi
 
-jq 'to_entries as $pages               
-    | reduce $pages[] as $entry ({};
-        if $entry.value.http_status_code != 200 then
-            .[$entry.key] = [
-                $pages[]
-                | select(.value.links | index($entry.key) != null)
-                | .key
-            ]
-        else
-            .
-        end
-    )' $RECENT_SITEMAP |tee output.json
+# Written next to sitemap.json by create_site_map.py: page -> pages linking to it
+BACKLINKS="$(dirname "$RECENT_SITEMAP")/backlinks.json"
+if [ ! -f "$BACKLINKS" ]; then
+    echo "No backlinks.json next to $RECENT_SITEMAP; re-run create_site_map.py to build it."
+    exit 1
+fi
 
+jq --slurpfile backlinks "$BACKLINKS" '
+    to_entries
+    | map(select(.value.http_status_code != 200)
+          | {key: .key, value: ($backlinks[0][.key] // [])})
+    | from_entries' "$RECENT_SITEMAP" |tee output.json
@@ -0,0 +1,149 @@
+import re
+import hashlib
+import threading
+from collections import Counter
+from urllib.parse import urlsplit, parse_qsl
+
+WORD_RE = re.compile(r'\w+')
+NUMBER_RE = re.compile(r'\d+')
+
+# Words per shingle; three keeps word order without making every edit count
+SHINGLE_SIZE = 3
+
+# Texts with fewer shingles give fingerprints too unstable to compare
+MIN_SHINGLES = 8
+
+FINGERPRINT_BITS = 64
+
+# Bits per counter when the bits of many hashes are counted at once
+LANE_BITS = 32
+
+# The 8 bits of every byte value, one per counter
+BYTE_LANES = [sum(1 << (bit * LANE_BITS) for bit in range(8) if value >> bit & 1) for value in range(256)]
+
+def simhash(text):
+    """
+    64-bit SimHash of the word shingles of `text`, as 16 hex digits (JSON
+    numbers cannot hold 64 bits exactly), or None for very short texts.
+    Texts that differ in a few words get fingerprints a few bits apart.
+    """
+    words = WORD_RE.findall(text.lower())
+    shingles = Counter(map(' '.join, zip(*(words[i:] for i in range(SHINGLE_SIZE)))))
+    if len(shingles) < MIN_SHINGLES:
+        return None
+    # Digests side by side, repeated as often as their shingle occurs, so
+    # bits are counted per byte position over at most 256 distinct values
+    # instead of per shingle
+    digests = b''.join(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest() * count
+                       for shingle, count in shingles.items())
+    total = len(digests) // 8
+    mask = (1 << LANE_BITS) - 1
+    fingerprint = 0
+    for position in range(8):
+        lanes = sum(BYTE_LANES[value] * count for value, count in Counter(digests[position::8]).items())
+        for bit in range(8):
+            # The bit is set when shingles with it set outweigh those without;
+            # the first byte of a digest holds the top bits
+            if 2 * ((lanes >> (bit * LANE_BITS)) & mask) > total:
+                fingerprint |= 1 << ((7 - position) * 8 + bit)
+    return f"{fingerprint:016x}"
+
+def url_pattern(url):
+    """
+    The shape of a URL, shared by pagination and filter variants of one page:
+    runs of digits in the path become {n} and query values are dropped, so
+    /blog/page/7?sort=new becomes /blog/page/{n}?sort.
+    """
+    parts = urlsplit(url)
+    names = sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    pattern = f"{parts.netloc}{NUMBER_RE.sub('{n}', parts.path)}"
+    return f"{pattern}?{'&'.join(names)}" if names else pattern
+
+class NearDuplicateIndex:
+    """
+    SimHash fingerprints indexed for near-duplicate lookups as pages finish.
+
+    Two pages are near-duplicates when their fingerprints differ in at most
+    `max_distance` bits. Each fingerprint is split into `max_distance + 1`
+    bands; any two within that distance agree on at least one whole band,
+    so only pages sharing a band are compared. With `pattern_limit`, a URL
+    pattern (see url_pattern) that has produced that many near-duplicates
+    stops being expanded: its pages are still recorded, but their links are
+    no longer followed.
+    """
+
+    def __init__(self, max_distance=3, pattern_limit=None):
+        self.max_distance = max_distance
+        self.pattern_limit = pattern_limit
+        self.band_count = max_distance + 1
+        self.band_bits = -(-FINGERPRINT_BITS // self.band_count)
+        self.bands = [{} for _ in range(self.band_count)]
+        # Indexed fingerprints, and the first page seen with each
+        self.fingerprints = {}
+        self.first_with = {}
+        self.order = {}
+        self.parents = {}
+        self.pattern_duplicates = Counter()
+        self.lock = threading.Lock()
+
+    def band_keys(self, fingerprint):
+        mask = (1 << self.band_bits) - 1
+        return [(fingerprint >> (i * self.band_bits)) & mask for i in range(self.band_count)]
+
+    def find(self, url):
+        # Union-find root, with path halving
+        while self.parents[url] != url:
+            self.parents[url] = self.parents[self.parents[url]]
+            url = self.parents[url]
+        return url
+
+    def add(self, url, fingerprint):
+        """Index a page; returns the first page of the near-duplicate cluster it joined, or None."""
+        if fingerprint is None:
+            return None
+        value = int(fingerprint, 16)
+        with self.lock:
+            if url in self.order:
+                return None
+            self.order[url] = len(self.order)
+            self.parents[url] = url
+            if value in self.first_with:
+                # Identical texts need no band lookup and no new bucket entries,
+                # so a flood of them does not slow the index down
+                matches = [self.first_with[value]]
+            else:
+                matches = []
+                keys = self.band_keys(value)
+                for band, key in zip(self.bands, keys):
+                    for other in band.get(key, ()):
+                        if other not in matches and bin(value ^ self.fingerprints[other]).count('1') <= self.max_distance:
+                            matches.append(other)
+                self.first_with[value] = url
+                self.fingerprints[url] = value
+                for band, key in zip(self.bands, keys):
+                    band.setdefault(key, []).append(url)
+            for other in matches:
+                self.union(url, other)
+            if not matches:
+                return None
+            self.pattern_duplicates[url_pattern(url)] += 1
+            return self.find(url)
+
+    def union(self, url, other):
+        # The earliest page of a cluster stays its root
+        first, second = sorted((self.find(url), self.find(other)), key=self.order.__getitem__)
+        self.parents[second] = first
+
+    def should_expand(self, url):
+        """False once the URL's pattern has produced `pattern_limit` near-duplicates."""
+        if not self.pattern_limit:
+            return True
+        with self.lock:
+            return self.pattern_duplicates[url_pattern(url)] < self.pattern_limit
+
+    def clusters(self):
+        """Every URL that has near-duplicates, mapped to the first page of its cluster."""
+        with self.lock:
+            roots = {url: self.find(url) for url in self.order}
+        sizes = Counter(roots.values())
+        return {url: root for url, root in roots.items() if sizes[root] > 1}
@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import socket
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    depth INTEGER NOT NULL,
+    state TEXT NOT NULL DEFAULT 'queued',
+    lease_owner TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS urls_queued ON urls (state, depth);
+CREATE INDEX IF NOT EXISTS urls_leases ON urls (state, lease_expires);
+CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, page TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+def default_worker_id():
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+class SharedFrontier:
+    """
+    Crawl frontier kept in a SQLite database that several crawler processes share.
+
+    It offers the same next()/complete() interface as CrawlFrontier. next()
+    leases a URL to this worker for `lease_seconds`; a lease that runs out,
+    because its worker died or hung, goes back to the next worker that asks,
+    up to `max_attempts` times. Results are stored as sitemap entries in the
+    `pages` table. The database is the only shared state: all access goes
+    through SQLite's locking, so it suits processes on one machine or on
+    hosts sharing a volume whose locks SQLite can rely on. Any store that
+    offers the same methods can take its place.
+    """
+
+    def __init__(self, path, max_depth=2, should_crawl=None, canonicalize=None, worker_id=None, lease_seconds=300, max_attempts=3, poll_interval=1.0, expand_links=None):
+        self.path = path
+        self.max_depth = max_depth
+        self.should_crawl = should_crawl
+        self.canonicalize = canonicalize
+        self.worker_id = worker_id or default_worker_id()
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.poll_interval = poll_interval
+        # Called as expand_links(url, page); False keeps the page's links out of the queue
+        self.expand_links = expand_links
+        # Durable on every commit, so there is nothing to checkpoint
+        self.state_path = None
+        self.site_map = {}
+        self.lock = threading.Lock()
+        # Transactions are opened explicitly with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(path, timeout=60, isolation_level=None, check_same_thread=False)
+        self.db.executescript(SCHEMA)
+
+    @contextmanager
+    def transaction(self):
+        """BEGIN IMMEDIATE ... COMMIT on the shared connection, one thread of this process at a time."""
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self.db
+            except BaseException:
+                self.db.execute("ROLLBACK")
+                raise
+            self.db.execute("COMMIT")
+
+    def reset(self, url):
+        """Start a new crawl from `url`, discarding whatever the store held."""
+        with self.transaction() as db:
+            db.execute("DELETE FROM urls")
+            db.execute("DELETE FROM pages")
+            db.execute("DELETE FROM meta")
+            db.execute("INSERT INTO meta (key, value) VALUES ('max_depth', ?), ('sources', '0')", (str(self.max_depth),))
+        self.admit(url, 0)
+
+    def join(self, coordinator=False):
+        """
+        Pick up the settings of the crawl the coordinator started; False if
+        there is none. A coordinator resuming after a crash feeds its sources
+        again, so the count it left behind is cleared.
+        """
+        with self.transaction() as db:
+            row = db.execute("SELECT value FROM meta WHERE key = 'max_depth'").fetchone()
+            if row is None:
+                return False
+            self.max_depth = int(row[0])
+            if coordinator:
+                db.execute("UPDATE meta SET value = '0' WHERE key = 'sources'")
+        return True
+
+    def insert(self, db, url, depth):
+        if self.canonicalize:
+            url = self.canonicalize(url)
+        if depth > self.max_depth:
+            return False
+        # Known URLs skip should_crawl, and filtered ones are kept as such,
+        # so a filter with budgets checks and counts each URL once
+        if self.should_crawl:
+            if db.execute("SELECT 1 FROM urls WHERE url = ?", (url,)).fetchone():
+                return False
+            if not self.should_crawl(url):
+                db.execute("INSERT INTO urls (url, depth, state) VALUES (?, ?, 'filtered')", (url, depth))
+                return False
+        return db.execute("INSERT OR IGNORE INTO urls (url, depth) VALUES (?, ?)", (url, depth)).rowcount > 0
+
+    def admit(self, url, depth):
+        with self.transaction() as db:
+            return self.insert(db, url, depth)
+
+    def add_source(self, urls, depth, batch_size=500):
+        # Workers keep waiting for URLs while any source is still being fed
+        self.change_sources(1)
+
+        def feed():
+            try:
+                batch = []
+                for url in urls:
+                    batch.append(url)
+                    if len(batch) >= batch_size:
+                        self.admit_batch(batch, depth)
+                        batch = []
+                self.admit_batch(batch, depth)
+            finally:
+                self.change_sources(-1)
+
+        threading.Thread(target=feed, daemon=True).start()
+
+    def admit_batch(self, urls, depth):
+        with self.transaction() as db:
+            for url in urls:
+                self.insert(db, url, depth)
+
+    def change_sources(self, delta):
+        with self.transaction() as db:
+            db.execute("UPDATE meta SET value = CAST(value AS INTEGER) + ? WHERE key = 'sources'", (delta,))
+
+    def lease(self, db, now):
+        while True:
+            row = db.execute("SELECT url, depth, attempts FROM urls WHERE state = 'leased' AND lease_expires < ? LIMIT 1", (now,)).fetchone()
+            if row is None:
+                row = db.execute("SELECT url, depth, attempts FROM urls WHERE state = 'queued' ORDER BY depth, rowid LIMIT 1").fetchone()
+            if row is None:
+                return None
+            url, depth, attempts = row
+            if attempts >= self.max_attempts:
+                print(f"Giving up on {url} after {attempts} expired leases")
+                db.execute("UPDATE urls SET state = 'failed', lease_owner = NULL WHERE url = ?", (url,))
+                continue
+            db.execute("UPDATE urls SET state = 'leased', lease_owner = ?, lease_expires = ?, attempts = attempts + 1 WHERE url = ?",
+                       (self.worker_id, now + self.lease_seconds, url))
+            return url, depth
+
+    def next(self):
+        """Lease the next URL; block while other workers or sources may still add some; None once the crawl is finished."""
+        while True:
+            with self.transaction() as db:
+                now = time.time()
+                item = self.lease(db, now)
+                if item is not None:
+                    return item
+                leased = db.execute("SELECT COUNT(*) FROM urls WHERE state = 'leased'").fetchone()[0]
+                sources = db.execute("SELECT CAST(value AS INTEGER) FROM meta WHERE key = 'sources'").fetchone()
+            if not leased and not (sources and sources[0]):
+                return None
+            time.sleep(self.poll_interval)
+
+    def complete(self, url, page):
+        with self.transaction() as db:
+            row = db.execute("SELECT depth, state FROM urls WHERE url = ?", (url,)).fetchone()
+            # Another worker took over the expired lease and finished first
+            if row is None or row[1] == 'done':
+                return
+            depth = row[0]
+            db.execute("UPDATE urls SET state = 'done', lease_owner = NULL WHERE url = ?", (url,))
+            if page is not None:
+                db.execute("INSERT OR REPLACE INTO pages (url, page) VALUES (?, ?)", (url, json.dumps(page)))
+                if self.expand_links is None or self.expand_links(url, page):
+                    for link in page["links"]:
+                        self.insert(db, link, depth + 1)
+
+    def count(self, query):
+        with self.lock:
+            return self.db.execute(query).fetchone()[0]
+
+    @property
+    def pages_done(self):
+        return self.count("SELECT COUNT(*) FROM pages")
+
+    @property
+    def queue(self):
+        # Only its length is used, to report progress
+        return range(self.count("SELECT COUNT(*) FROM urls WHERE state IN ('queued', 'leased')"))
+
+    def checkpoint(self):
+        pass
+
+    def load(self):
+        return self.join()
+
+    def export_page_log(self, path):
+        """Write the stored pages as a page log (see sitemap_output.PageLog) for compact_page_log."""
+        with self.lock, open(path, 'w', encoding='utf-8') as f:
+            for url, page in self.db.execute("SELECT url, page FROM pages ORDER BY rowid"):
+                f.write(f'{{"url": {json.dumps(url)}, "page": {page}}}\n')
+
+    def close(self):
+        self.db.close()
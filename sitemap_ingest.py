@@ -0,0 +1,124 @@
+import io
+import gzip
+import queue
+import threading
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import requests
+
+GZIP_MAGIC = b'\x1f\x8b'
+
+def find_sitemap_urls(base_url, http_session=None, timeout=30):
+    """Sitemaps listed in robots.txt, or /sitemap.xml when robots.txt names none."""
+    http_session = http_session or requests.Session()
+    sitemap_urls = []
+    try:
+        response = http_session.get(urljoin(base_url, '/robots.txt'), timeout=timeout)
+        if response.status_code == 200:
+            for line in response.text.splitlines():
+                name, _, value = line.partition(':')
+                if name.strip().lower() == 'sitemap' and value.strip():
+                    sitemap_urls.append(value.strip())
+    except requests.RequestException as e:
+        print(f"Failed to fetch robots.txt for {base_url}: {e}")
+    return sitemap_urls or [urljoin(base_url, '/sitemap.xml')]
+
+def local_name(tag):
+    return tag.rsplit('}', 1)[-1]
+
+def parse_sitemap(stream):
+    """
+    Incrementally parse a sitemap or sitemap index.
+    Yields ('url', loc) for pages and ('sitemap', loc) for child sitemaps;
+    finished elements are cleared so memory stays flat however long the file is.
+    """
+    context = ET.iterparse(stream, events=('start', 'end'))
+    _, root = next(context)
+    for event, element in context:
+        if event != 'end':
+            continue
+        kind = local_name(element.tag)
+        if kind in ('url', 'sitemap'):
+            loc = next((child.text for child in element if local_name(child.tag) == 'loc'), None)
+            if loc and loc.strip():
+                yield kind, loc.strip()
+            root.clear()
+
+def open_sitemap(http_session, sitemap_url, timeout=30):
+    response = http_session.get(sitemap_url, stream=True, timeout=timeout)
+    if response.status_code != 200:
+        response.close()
+        print(f"Failed to fetch sitemap: {sitemap_url}")
+        return None, None
+
+    # Content-Encoding is undone by urllib3; .xml.gz files are gzipped on top of that
+    response.raw.decode_content = True
+    # gzip reads past the end of the body to check its trailer, which fails once urllib3 has closed it
+    response.raw.auto_close = False
+    stream = io.BufferedReader(response.raw)
+    if stream.peek(2)[:2] == GZIP_MAGIC:
+        stream = gzip.GzipFile(fileobj=stream)
+    return response, stream
+
+def iter_sitemap_urls(sitemap_urls, http_session=None, workers=8, timeout=30, buffer_size=10000):
+    """
+    Stream every page URL from a list of sitemaps, following sitemap indexes.
+    Child sitemaps are fetched and parsed concurrently. URLs pass through a
+    bounded buffer, so parsing pauses while the consumer is busy and
+    multi-million URL sitemaps never have to fit in memory.
+    """
+    http_session = http_session or requests.Session()
+    results = queue.Queue(buffer_size)
+    stop = threading.Event()
+
+    def put(item):
+        while not stop.is_set():
+            try:
+                results.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def read_sitemap(sitemap_url):
+        response = None
+        try:
+            response, stream = open_sitemap(http_session, sitemap_url, timeout)
+            if stream is not None:
+                for item in parse_sitemap(stream):
+                    if not put(item):
+                        return
+        except (requests.RequestException, ET.ParseError, OSError, EOFError, ValueError) as e:
+            print(f"Failed to read sitemap {sitemap_url}: {e}")
+        finally:
+            if response is not None:
+                response.close()
+            put(('done', sitemap_url))
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    seen_sitemaps = set()
+    pending = 0
+    try:
+        for sitemap_url in sitemap_urls:
+            if sitemap_url not in seen_sitemaps:
+                seen_sitemaps.add(sitemap_url)
+                pending += 1
+                executor.submit(read_sitemap, sitemap_url)
+
+        while pending:
+            kind, loc = results.get()
+            if kind == 'done':
+                pending -= 1
+            elif kind == 'sitemap':
+                if loc not in seen_sitemaps:
+                    print(f"Found child sitemap: {loc}")
+                    seen_sitemaps.add(loc)
+                    pending += 1
+                    executor.submit(read_sitemap, loc)
+            else:
+                yield loc
+    finally:
+        # Also reached when the consumer stops early; unblock and discard the readers
+        stop.set()
+        executor.shutdown(wait=False, cancel_futures=True)
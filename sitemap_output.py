@@ -0,0 +1,141 @@
+import os
+import glob
+import gzip
+import json
+import threading
+from urllib.parse import urljoin
+from xml.sax.saxutils import escape
+from near_duplicates import NearDuplicateIndex
+from crawl_utils import write_atomic
+
+# Limits for a single sitemap file from sitemaps.org
+SITEMAP_MAX_URLS = 50000
+SITEMAP_MAX_BYTES = 50 * 1024 * 1024
+
+SITEMAP_NS = 'http://www.sitemaps.org/schemas/sitemap/0.9'
+
+class PageLog:
+    """Append-only JSONL file holding one record per crawled page, written as soon as the page is done."""
+
+    def __init__(self, path, append=False):
+        self.path = path
+        self.file = open(path, 'a' if append else 'w', encoding='utf-8')
+        self.lock = threading.Lock()
+
+    def write(self, url, page):
+        line = json.dumps({"url": url, "page": page}) + "\n"
+        with self.lock:
+            self.file.write(line)
+            self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+def index_page_log(path):
+    """
+    Byte offset of the last record for each URL, in order of first appearance.
+    Pages recrawled after a resume appear more than once; the newest wins.
+    """
+    offsets = {}
+    offset = 0
+    with open(path, 'rb') as f:
+        for line in f:
+            try:
+                offsets[json.loads(line)["url"]] = offset
+            except (ValueError, KeyError):
+                # A line cut short when the crawl was killed
+                pass
+            offset += len(line)
+    return offsets
+
+def iter_pages(path, offsets=None):
+    """Yield (url, page) for every URL in a page log, reading one record at a time."""
+    offsets = offsets if offsets is not None else index_page_log(path)
+    with open(path, 'rb') as f:
+        for url, offset in offsets.items():
+            f.seek(offset)
+            yield url, json.loads(f.readline())["page"]
+
+def is_indexable(page):
+    # Chrome pages without a recorded document response have no status
+    status = page.get("http_status_code")
+    return status is None or 200 <= status < 300
+
+def write_sitemap_xml(urls, output_dir, base_url):
+    """
+    Write gzipped sitemap-N.xml.gz files of at most 50,000 URLs and 50 MB each,
+    and a sitemap.xml index that lists them. Returns the number of files.
+    """
+    for stale_path in glob.glob(os.path.join(output_dir, 'sitemap-*.xml.gz')):
+        os.remove(stale_path)
+
+    part_names = []
+    part, part_urls, part_bytes = None, 0, 0
+    header = f'<?xml version="1.0" encoding="UTF-8"?>\n<urlset xmlns="{SITEMAP_NS}">\n'
+    footer = '</urlset>\n'
+    for url in urls:
+        entry = f'  <url><loc>{escape(url)}</loc></url>\n'
+        if part is not None and (part_urls >= SITEMAP_MAX_URLS or part_bytes + len(entry) + len(footer) > SITEMAP_MAX_BYTES):
+            part.write(footer)
+            part.close()
+            part = None
+        if part is None:
+            part_names.append(f'sitemap-{len(part_names) + 1}.xml.gz')
+            part = gzip.open(os.path.join(output_dir, part_names[-1]), 'wt', encoding='utf-8')
+            part.write(header)
+            part_urls, part_bytes = 0, len(header)
+        part.write(entry)
+        part_urls += 1
+        part_bytes += len(entry.encode('utf-8'))
+    if part is not None:
+        part.write(footer)
+        part.close()
+
+    def write_index(f):
+        f.write(f'<?xml version="1.0" encoding="UTF-8"?>\n<sitemapindex xmlns="{SITEMAP_NS}">\n')
+        for name in part_names:
+            f.write(f'  <sitemap><loc>{escape(urljoin(base_url, "/" + name))}</loc></sitemap>\n')
+        f.write('</sitemapindex>\n')
+
+    write_atomic(os.path.join(output_dir, 'sitemap.xml'), write_index)
+    return len(part_names)
+
+def find_near_duplicates(log_path, offsets, max_distance=3):
+    """Every page with near-duplicates in a page log, mapped to the first crawled page of its cluster."""
+    index = NearDuplicateIndex(max_distance)
+    for url, page in iter_pages(log_path, offsets):
+        index.add(url, page.get("simhash"))
+    return index.clusters()
+
+def compact_page_log(log_path, output_dir, base_url, canonicalize=None, near_duplicate_distance=3):
+    """
+    Turn a page log into sitemap.json, sitemap.xml and backlinks.json.
+    backlinks.json maps every crawled URL to the pages that link to it, so
+    finding who links to a broken page is a lookup instead of a scan. Links
+    are canonicalized like the crawl did, so they match the site map's keys.
+    Pages with near-duplicates get a `near_duplicate_cluster` entry: the
+    first crawled page of their cluster. Returns the number of pages.
+    """
+    offsets = index_page_log(log_path)
+    clusters = find_near_duplicates(log_path, offsets, near_duplicate_distance)
+    indexable_urls = []
+    backlinks = {}
+
+    def write_pages(f):
+        f.write('{')
+        for count, (url, page) in enumerate(iter_pages(log_path, offsets)):
+            f.write(',\n' if count else '\n')
+            if url in clusters:
+                page["near_duplicate_cluster"] = clusters[url]
+            f.write(f'    {json.dumps(url)}: {json.dumps(page)}')
+            if is_indexable(page):
+                indexable_urls.append(url)
+            for link in set(map(canonicalize, page["links"]) if canonicalize else page["links"]):
+                if link in offsets and link != url:
+                    backlinks.setdefault(link, []).append(url)
+        f.write('\n}\n')
+
+    write_atomic(os.path.join(output_dir, 'sitemap.json'), write_pages)
+    write_sitemap_xml(indexable_urls, output_dir, base_url)
+    write_atomic(os.path.join(output_dir, 'backlinks.json'), lambda f: json.dump(backlinks, f))
+    return len(offsets)
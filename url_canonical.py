@@ -0,0 +1,82 @@
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode, quote
+
+# Query parameters that only track where a visitor came from
+TRACKING_PARAMS = frozenset({
+    'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'twclid', 'igshid',
+    'mc_cid', 'mc_eid', '_ga', '_gl', '_hsenc', '_hsmi', 'mkt_tok', 'ref_src',
+})
+TRACKING_PREFIXES = ('utm_',)
+
+DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+TRAILING_SLASH_RULES = ('keep', 'strip', 'add')
+
+def canonical_netloc(parts):
+    # Raises ValueError for a malformed port, e.g. a non-numeric one
+    port = parts.port
+    host = (parts.hostname or '').rstrip('.')
+    if ':' in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+    return host
+
+def canonical_host(url):
+    """The host of `url` as UrlCanonicalizer writes it: https://Example.com:443/ gives example.com."""
+    return canonical_netloc(urlsplit(url))
+
+class UrlCanonicalizer:
+    """
+    Rewrites URLs so that variants of one page share a single key.
+    Scheme and host are lowercased, default ports and #fragments dropped,
+    tracking parameters removed and the remaining query sorted. The rest is
+    opt-in because it is only safe on some sites: `drop_params` removes more
+    parameters, `drop_query` removes the whole query, `trailing_slash` strips
+    or adds the final slash of the path, and `lowercase_path` folds its case.
+    """
+
+    def __init__(self, drop_params=(), drop_query=False, trailing_slash='keep', lowercase_path=False, strip_fragment=True, sort_query=True):
+        if trailing_slash not in TRAILING_SLASH_RULES:
+            raise ValueError(f"Unknown trailing slash rule: {trailing_slash}")
+        self.drop_params = TRACKING_PARAMS | frozenset(drop_params)
+        self.drop_query = drop_query
+        self.trailing_slash = trailing_slash
+        self.lowercase_path = lowercase_path
+        self.strip_fragment = strip_fragment
+        self.sort_query = sort_query
+
+    def keep_param(self, name):
+        name = name.lower()
+        return name not in self.drop_params and not name.startswith(TRACKING_PREFIXES)
+
+    def __call__(self, url):
+        try:
+            parts = urlsplit(url)
+            host = canonical_netloc(parts)
+        except ValueError:
+            # Malformed, e.g. a non-numeric port; leave it for the URL filter to reject
+            return url
+        scheme = parts.scheme.lower()
+
+        if parts.username is not None:
+            credentials = parts.username if parts.password is None else f"{parts.username}:{parts.password}"
+            host = f"{credentials}@{host}"
+
+        path = parts.path or '/'
+        if self.lowercase_path:
+            path = path.lower()
+        if self.trailing_slash == 'strip' and path != '/':
+            path = path.rstrip('/') or '/'
+        elif self.trailing_slash == 'add' and not path.endswith('/') and '.' not in path.rsplit('/', 1)[-1]:
+            # Paths that look like files (page.html) keep their form
+            path += '/'
+
+        query = ''
+        if parts.query and not self.drop_query:
+            params = [(name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True) if self.keep_param(name)]
+            if self.sort_query:
+                params.sort()
+            query = urlencode(params, quote_via=quote)
+
+        fragment = '' if self.strip_fragment else parts.fragment
+        return urlunsplit((scheme, host, path, query, fragment))
@@ -0,0 +1,141 @@
+import re
+import threading
+from collections import Counter
+from urllib.parse import urlsplit
+from url_canonical import canonical_netloc
+
+# Path segments that mark a translated copy of a page, e.g. /fr/ or /en-gb/
+LANGUAGE_CODES = frozenset({
+    'fr', 'es', 'de', 'it', 'ja', 'ko', 'zh', 'sg', 'id', 'th', 'vi', 'ms',
+    'ar', 'hi', 'bn', 'ur', 'fa', 'tr', 'nl', 'pl', 'cs', 'sk', 'hu', 'ro',
+    'bg', 'sr', 'hr', 'sl', 'mk',
+    'en-nl', 'nl-nl', 'en-es', 'id-id', 'fr-fr', 'en-fr', 'en-ca', 'en-gb',
+    'en-au', 'en-nz', 'en-sg', 'en-hk', 'en-in', 'en-ph', 'en-id', 'en-my',
+    'en-th', 'en-tw', 'en-kr', 'en-jp', 'en-cn', 'en-tr', 'en-ae', 'en-sa',
+    'en-eg', 'en-il', 'en-ng', 'en-za', 'en-ke', 'en-ug', 'en-zm', 'en-zw',
+    'en-gh',
+})
+
+# Why a URL was filtered, in the order the checks run
+FILTER_REASONS = ('off_site', 'out_of_scope', 'translated', 'excluded', 'not_included', 'too_many_params', 'query_budget', 'prefix_cap')
+
+def is_translated_path(path, language_codes=LANGUAGE_CODES):
+    return any(segment.lower() in language_codes for segment in path.split('/') if segment)
+
+def compile_patterns(patterns):
+    # One alternation, so a URL is matched once however many patterns there are
+    patterns = list(patterns or ())
+    return re.compile('|'.join(f'(?:{pattern})' for pattern in patterns)) if patterns else None
+
+class UrlFilter:
+    """
+    Decides which discovered URLs are worth fetching, and counts the rest.
+
+    Checks run cheapest first and each costs about the same however many
+    URLs were seen: the host must be `base_domain` (as canonical_host gives
+    it) or a subdomain of it, compared without case or default ports,
+    the URL must start with the `scope` passed to allow(), translated
+    paths (see LANGUAGE_CODES) can be skipped, and the URL must match no
+    `exclude` pattern and, if there are any, an `include` pattern. Budgets
+    then cap how much of the site one shape of URL may take: at most
+    `max_query_params` query parameters, `max_query_variants` query strings
+    per path, and `max_per_prefix` URLs under each path prefix of
+    `prefix_depth` segments. Budgets count admitted URLs and `rejected`
+    counts filtered URLs by reason (see FILTER_REASONS), so allow() should
+    only be called once per URL: callers remember the URLs it turned down
+    as well as the ones it let through.
+    """
+
+    def __init__(self, base_domain=None, exclude_translations=False, include=(), exclude=(), max_per_prefix=None, prefix_depth=1, max_query_params=None, max_query_variants=None, language_codes=LANGUAGE_CODES):
+        self.base_domain = base_domain.lower() if base_domain else None
+        self.exclude_translations = exclude_translations
+        self.include = compile_patterns(include)
+        self.exclude = compile_patterns(exclude)
+        self.max_per_prefix = max_per_prefix
+        self.prefix_depth = prefix_depth
+        self.max_query_params = max_query_params
+        self.max_query_variants = max_query_variants
+        self.language_codes = language_codes
+        self.prefix_counts = Counter()
+        self.query_variants = Counter()
+        self.allowed = 0
+        self.rejected = Counter()
+        self.lock = threading.Lock()
+
+    def reject_reason(self, url, parts, scope=None):
+        """Why `url` (split into `parts`) should be filtered, or None to keep it. Counts nothing."""
+        if self.base_domain:
+            try:
+                host = canonical_netloc(parts)
+            except ValueError:
+                return 'off_site'
+            if not (host == self.base_domain or host.endswith('.' + self.base_domain)):
+                return 'off_site'
+        if scope and not url.startswith(scope):
+            return 'out_of_scope'
+        if self.exclude_translations and is_translated_path(parts.path, self.language_codes):
+            return 'translated'
+        if self.exclude and self.exclude.search(url):
+            return 'excluded'
+        if self.include and not self.include.search(url):
+            return 'not_included'
+        if parts.query:
+            if self.max_query_params is not None and sum(1 for param in parts.query.split('&') if param) > self.max_query_params:
+                return 'too_many_params'
+            if self.max_query_variants is not None and self.query_variants[self.path_key(parts)] >= self.max_query_variants:
+                return 'query_budget'
+        if self.max_per_prefix is not None and self.prefix_counts[self.prefix_key(parts)] >= self.max_per_prefix:
+            return 'prefix_cap'
+        return None
+
+    def path_key(self, parts):
+        return f"{parts.netloc}{parts.path}"
+
+    def prefix_key(self, parts):
+        segments = [segment for segment in parts.path.split('/') if segment][:self.prefix_depth]
+        return f"{parts.netloc}/{'/'.join(segments)}"
+
+    def allow(self, url, scope=None):
+        """Whether to fetch `url`; a True answer uses up its budgets."""
+        parts = urlsplit(url)
+        with self.lock:
+            reason = self.reject_reason(url, parts, scope)
+            if reason:
+                self.rejected[reason] += 1
+                return False
+            if parts.query and self.max_query_variants is not None:
+                self.query_variants[self.path_key(parts)] += 1
+            if self.max_per_prefix is not None:
+                self.prefix_counts[self.prefix_key(parts)] += 1
+            self.allowed += 1
+            return True
+
+    def summary(self):
+        filtered = sum(self.rejected.values())
+        if not filtered:
+            return f"URL filter: {self.allowed} admitted, none filtered"
+        reasons = ', '.join(f"{reason} {self.rejected[reason]}" for reason in FILTER_REASONS if self.rejected[reason])
+        return f"URL filter: {self.allowed} admitted, {filtered} filtered ({reasons})"
+
+    def dump(self):
+        with self.lock:
+            return {"allowed": self.allowed, "rejected": dict(self.rejected),
+                    "prefix_counts": dict(self.prefix_counts), "query_variants": dict(self.query_variants)}
+
+    def load(self, data):
+        with self.lock:
+            self.allowed = data["allowed"]
+            self.rejected = Counter(data["rejected"])
+            self.prefix_counts = Counter(data["prefix_counts"])
+            self.query_variants = Counter(data["query_variants"])
+
+def add_filter_arguments(parser):
+    parser.add_argument('--include', action='append', metavar='REGEX', help="Only fetch URLs matching this regular expression; repeat for more.")
+    parser.add_argument('--exclude', action='append', metavar='REGEX', help="Never fetch URLs matching this regular expression; repeat for more.")
+    parser.add_argument('--max-per-prefix', type=int, help="Most URLs fetched under one path prefix, e.g. /blog/ (see --prefix-depth).")
+    parser.add_argument('--prefix-depth', type=int, default=1, help="Path segments that make up a prefix for --max-per-prefix (default: 1).")
+    parser.add_argument('--max-query-params', type=int, help="Skip URLs with more query parameters than this.")
+    parser.add_argument('--max-query-variants', type=int, help="Most distinct query strings fetched per path, e.g. for sort and filter variants.")
+
+def filter_from_args(args, base_domain=None, exclude_translations=False):
+    return UrlFilter(base_domain, exclude_translations, args.include, args.exclude, args.max_per_prefix, args.prefix_depth, args.max_query_params, args.max_query_variants)
@@ -0,0 +1,156 @@
+import math
+import heapq
+import bisect
+import sqlite3
+import hashlib
+from array import array
+
+VISITED_SET_KINDS = ('exact', 'hashed', 'bloom')
+
+# Fewest new hashes HashedVisitedSet collects before merging them into its array
+MIN_MERGE_SIZE = 4096
+
+def url_key(url):
+    """64-bit hash of a URL; collisions stay unlikely (about 1 in 40 million) even at a million URLs."""
+    return int.from_bytes(hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest(), 'big')
+
+class ExactVisitedSet(set):
+    """Every URL as a string; the smallest crawls need nothing more."""
+
+    def dump(self):
+        # A copy, cheap enough to take under the frontier's lock
+        return list(self)
+
+    def load(self, data):
+        self.update(data)
+
+    def close(self):
+        pass
+
+class HashedVisitedSet:
+    """
+    URLs kept as 64-bit hashes in a sorted array, about 8 bytes each instead
+    of a Python string. New hashes collect in a small set that is merged into
+    the array once it reaches an eighth of its size, so merging stays cheap
+    however large the crawl gets.
+    """
+
+    def __init__(self):
+        self.keys = array('Q')
+        self.recent = set()
+
+    def add(self, url):
+        key = url_key(url)
+        if key not in self:
+            self.recent.add(key)
+            if len(self.recent) > max(MIN_MERGE_SIZE, len(self.keys) // 8):
+                self.merge()
+
+    def merge(self):
+        self.keys = array('Q', heapq.merge(self.keys, sorted(self.recent)))
+        self.recent = set()
+
+    def __contains__(self, url):
+        key = url if isinstance(url, int) else url_key(url)
+        if key in self.recent:
+            return True
+        index = bisect.bisect_left(self.keys, key)
+        return index < len(self.keys) and self.keys[index] == key
+
+    def __len__(self):
+        return len(self.keys) + len(self.recent)
+
+    def dump(self):
+        # A flat copy of the keys, recent ones unsorted; merging and listing
+        # them would hold up the frontier for the length of the crawl
+        return self.keys + array('Q', self.recent)
+
+    def load(self, data):
+        # Checkpoints written with the exact set hold the URLs themselves
+        for item in data:
+            key = url_key(item) if isinstance(item, str) else item
+            if key not in self:
+                self.recent.add(key)
+        self.merge()
+
+    def close(self):
+        pass
+
+class BloomVisitedSet:
+    """
+    Bloom filter in memory with the exact set in SQLite on disk.
+    The filter answers "never seen" for almost every new URL without touching
+    the disk; its rare false positives are settled by the database, so no
+    URL is ever wrongly skipped. Memory stays at about 1.8 bytes per URL of
+    `capacity` at the default error rate. Rows are committed with every
+    checkpoint, so the database always matches the last checkpoint.
+    """
+
+    def __init__(self, path, capacity=10_000_000, error_rate=0.001, keep_existing=False):
+        self.path = path
+        self.bit_count = max(int(-capacity * math.log(error_rate) / math.log(2) ** 2), 8)
+        self.hash_count = max(round(self.bit_count / capacity * math.log(2)), 1)
+        self.bits = bytearray((self.bit_count + 7) // 8)
+        self.count = 0
+        # The frontier serialises all access, so the connection can move between threads
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY) WITHOUT ROWID")
+        if not keep_existing:
+            self.db.execute("DELETE FROM visited")
+            self.db.commit()
+
+    def positions(self, url):
+        # Double hashing: k positions from two 64-bit halves of one digest
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'big')
+        second = int.from_bytes(digest[8:], 'big') | 1
+        return [(first + i * second) % self.bit_count for i in range(self.hash_count)]
+
+    def set_bits(self, url):
+        for position in self.positions(url):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def add(self, url):
+        if self.db.execute("INSERT OR IGNORE INTO visited (url) VALUES (?)", (url,)).rowcount:
+            self.count += 1
+        self.set_bits(url)
+
+    def __contains__(self, url):
+        for position in self.positions(url):
+            if not self.bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return self.db.execute("SELECT 1 FROM visited WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self):
+        return self.count
+
+    def dump(self):
+        self.db.commit()
+        return {"sqlite": self.path, "count": self.count}
+
+    def load(self, data):
+        if isinstance(data, list):
+            # A checkpoint written with another kind of set
+            for url in data:
+                if isinstance(url, str):
+                    self.add(url)
+            return
+        # Whatever was added after the checkpoint was never committed
+        self.db.rollback()
+        self.count = 0
+        self.bits = bytearray(len(self.bits))
+        for (url,) in self.db.execute("SELECT url FROM visited"):
+            self.set_bits(url)
+            self.count += 1
+
+    def close(self):
+        self.db.close()
+
+def create_visited_set(kind='exact', path=None, capacity=10_000_000, keep_existing=False):
+    if kind == 'exact':
+        return ExactVisitedSet()
+    if kind == 'hashed':
+        return HashedVisitedSet()
+    if kind == 'bloom':
+        return BloomVisitedSet(path, capacity, keep_existing=keep_existing)
+    raise ValueError(f"Unknown visited set: {kind}")